@@ -1,7 +1,12 @@
 import asyncio
 import logging
 
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
 from src.bot import create_bot
+from src.config import WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET, WEBAPP_HOST, WEBAPP_PORT
 
 logging.basicConfig(
     level=logging.INFO,
@@ -9,12 +14,51 @@ logging.basicConfig(
 )
 
 
+async def run_webhook(bot: Bot, dp: Dispatcher):
+    """Serve updates pushed by Telegram instead of polling for them."""
+    app = web.Application()
+    SimpleRequestHandler(dispatcher=dp, bot=bot, secret_token=WEBHOOK_SECRET).register(app, path=WEBHOOK_PATH)
+    # Runs the dispatcher startup/shutdown hooks with the app
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, WEBAPP_HOST, WEBAPP_PORT).start()
+        await bot.set_webhook(
+            url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+        logging.info(f"Webhook server listening on {WEBAPP_HOST}:{WEBAPP_PORT}")
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
 async def main():
+    if WEBHOOK_URL and not WEBHOOK_SECRET:
+        # Without the secret anyone could post forged updates, including payments
+        raise RuntimeError("WEBHOOK_SECRET must be set when WEBHOOK_URL is set")
+
     bot, dp = create_bot()
 
+    if WEBHOOK_URL:
+        logging.info("Starting bot in webhook mode...")
+        await run_webhook(bot, dp)
+        return
+
     logging.info("Starting bot...")
-    await dp.start_polling(bot)
+    # getUpdates is refused while a webhook from a previous webhook run is still set
+    await bot.delete_webhook()
+    # Only ask Telegram for update types that have handlers
+    await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(main())
+    else:
+        uvloop.run(main())
@@ -9,39 +9,51 @@ Usage:
 
 import asyncio
 import sys
+from datetime import datetime
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from src.gift_card_payment import gift_card_manager
-from src import database as db
-
 
 async def batch_create(count: int, searches: int):
     """Create batch of gift cards."""
+    from src.gift_card_payment import gift_card_manager
+
     print(f"Creating {count} gift cards with {searches} searches each...\n")
 
     cards = await gift_card_manager.create_gift_cards(
         count=count,
-        searches_amount=searches
+        searches_amount=searches,
+        batch_id=f"batch_{datetime.now():%Y%m%d_%H%M%S}"
     )
 
     if not cards:
         print("❌ Error: No cards were created")
         return
 
+    # Buffer output and flush every 100 cards instead of one write per line
+    lines = []
     for i, card in enumerate(cards, 1):
         code = card.get('code', 'UNKNOWN')
-        print(f"✓ {code}")
+        lines.append(f"✓ {code}")
 
         if i % 10 == 0:
-            print(f"  Progress: {i}/{count}")
+            lines.append(f"  Progress: {i}/{count}")
+
+        if i % 100 == 0:
+            sys.stdout.write("\n".join(lines) + "\n")
+            lines.clear()
+
+    if lines:
+        sys.stdout.write("\n".join(lines) + "\n")
 
     print(f"\n✅ Successfully created {len(cards)} gift cards!")
 
 
 async def show_stats():
     """Show gift card statistics."""
+    from src.gift_card_payment import gift_card_manager
+
     stats = await gift_card_manager.get_redemption_stats()
 
     print("\n📊 Gift Card Statistics:")
@@ -79,4 +91,9 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(main())
+    else:
+        uvloop.run(main())
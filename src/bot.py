@@ -1,51 +1,91 @@
 import asyncio
-import base64
+import binascii
+import heapq
 import logging
+import os
+import re
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, suppress
+from functools import lru_cache
 from io import BytesIO
+from typing import BinaryIO
 
 import httpx
+import orjson
+import pybase64
 from aiogram import Bot, Dispatcher, Router, F
 from aiogram.types import (
-    Message, LinkPreviewOptions, BufferedInputFile,
+    Message, LinkPreviewOptions, BufferedInputFile, InputMediaPhoto,
     CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton,
     LabeledPrice, PreCheckoutQuery
 )
 from aiogram.filters import CommandStart, Command
-from aiogram.enums import ParseMode
+from aiogram.filters.callback_data import CallbackData
+from aiogram.enums import ContentType, ParseMode
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
 from aiogram.exceptions import TelegramBadRequest
 
-from PIL import Image, ImageFilter
-
 logger = logging.getLogger(__name__)
 
 from src.config import (
     TELEGRAM_BOT_TOKEN, SEARCH_COST_STARS, SEARCH_PACK_5_STARS,
     UNLOCK_SINGLE_STARS, UNLOCK_ALL_STARS, ADMIN_CHAT_ID,
-    API_BALANCE_ALERT_THRESHOLD, VK_SEARCH_COST_STARS, TT_SEARCH_COST_STARS
+    API_BALANCE_ALERT_THRESHOLD, VK_SEARCH_COST_STARS, TT_SEARCH_COST_STARS,
+    is_admin
 )
 from src.facecheck_client import FaceCheckClient
 from src.search4faces_client import Search4FacesClient
 from src import database as db
 from src import vk_client
 from src.gift_card_handlers import register_gift_card_handlers
+from src.throttling import RateLimitMiddleware
 from aiogram.fsm.storage.memory import MemoryStorage
 
 router = Router()
+
+# Команды бота: один фильтр на роутер отсекает фото и прочие сообщения,
+# не прогоняя их через фильтр каждой команды
+commands_router = Router(name="commands")
+commands_router.message.filter(F.text.startswith("/"))
+
 facecheck = FaceCheckClient()
 search4faces = Search4FacesClient()
 
 # Version for debugging deployments
 BOT_VERSION = "v6.1-mode-selection"
 
+# Сколько секунд отдаём баланс FaceCheck из кэша
+API_INFO_CACHE_TTL = 60
+
+# (время запроса, ответ /info) — последний известный баланс API
+_api_info_cache: tuple[float, dict] | None = None
+
+# Одновременные промахи кэша ждут один запрос вместо нескольких
+_api_info_lock = asyncio.Lock()
+
+
+async def get_api_info() -> dict | None:
+    """Информация об аккаунте FaceCheck с кэшем на API_INFO_CACHE_TTL секунд."""
+    global _api_info_cache
+    async with _api_info_lock:
+        if _api_info_cache and time.monotonic() - _api_info_cache[0] < API_INFO_CACHE_TTL:
+            return _api_info_cache[1]
+
+        info = await facecheck.get_info()
+        if info:
+            _api_info_cache = (time.monotonic(), info)
+        return info
+
 async def check_api_balance_and_alert(bot: Bot):
     """Check FaceCheck API balance and send notification after each search."""
     if not ADMIN_CHAT_ID:
         return
 
     try:
-        info = await facecheck.get_info()
+        info = await get_api_info()
         if not info:
             return
 
@@ -94,16 +134,24 @@ async def notify_admin_search(bot: Bot, user_id: int, username: str | None,
         logger.error(f"Admin notification error: {e}")
 
 # Store pending search results temporarily (search_id -> {result, created_at, user_id, unlocked})
-pending_results: dict[str, dict] = {}
+# Ordered by creation time: oldest entries are evicted first
+pending_results: OrderedDict[str, dict] = OrderedDict()
+
+# Store pending photos for search (user_id -> Telegram file_id), least recently stored first
+# Фото скачивается только когда поиск действительно запускается
+pending_photos: OrderedDict[int, str] = OrderedDict()
 
-# Store pending photos for paid search (user_id -> image_bytes)
-pending_photos: dict[int, bytes] = {}
+# Store last search_id for each user (for /debug command), least recently stored first
+last_search_by_user: OrderedDict[int, str] = OrderedDict()
 
-# Store last search_id for each user (for /debug command)
-last_search_by_user: dict[int, str] = {}
+# Reminder queue ordered by fire time: (fire_at, search_id, user_id)
+reminder_heap: list[tuple[float, str, int]] = []
 
-# Store pending reminder tasks (search_id -> asyncio.Task)
-pending_reminders: dict[str, asyncio.Task] = {}
+# Searches whose reminder is still due (cancelled ones are skipped when popped)
+scheduled_reminders: set[str] = set()
+
+# Wakes the reminder worker when a new reminder is queued
+reminder_added = asyncio.Event()
 
 # Store user's selected search mode (user_id -> "internet" | "vk")
 user_search_mode: dict[int, str] = {}
@@ -111,39 +159,134 @@ user_search_mode: dict[int, str] = {}
 # Results expiration time in seconds
 RESULTS_EXPIRATION_SECONDS = 30 * 60  # 30 минут
 
+# Max number of searches kept in memory
+MAX_PENDING_RESULTS = 10_000
+
+# Max number of photos waiting for confirmation
+MAX_PENDING_PHOTOS = 10_000
+
+# How often expired results are purged
+RESULTS_SWEEP_INTERVAL_SECONDS = 60
+
 # Reminder time (5 minutes before expiration)
 REMINDER_DELAY_SECONDS = 25 * 60  # 25 минут
 
 # Free search shows only 3 results (paid shows 10)
 FREE_RESULTS_COUNT = 3
 
+# Largest photo size we download (higher resolutions are downsampled by the API anyway)
+MAX_PHOTO_SIZE_BYTES = 4_000_000
+
+# Max concurrent result image downloads
+IMAGE_FETCH_CONCURRENCY = 8
+image_fetch_semaphore = asyncio.Semaphore(IMAGE_FETCH_CONCURRENCY)
+
+# Minimum interval between photos from one user
+PHOTO_COOLDOWN_SECONDS = 3
+
+# Store time of last accepted photo (user_id -> timestamp)
+last_photo_at: dict[int, float] = {}
+
+# Minimum interval between "send a photo" hints to one user
+NAG_COOLDOWN_SECONDS = 60
+
+# Store time of last hint (user_id -> timestamp)
+last_nag_at: dict[int, float] = {}
+
+
+def schedule_expiry_reminder(user_id: int, search_id: str):
+    """Запланировать напоминание за 5 минут до истечения результатов."""
+    heapq.heappush(reminder_heap, (time.time() + REMINDER_DELAY_SECONDS, search_id, user_id))
+    scheduled_reminders.add(search_id)
+    reminder_added.set()
+
+
+def cancel_reminder(search_id: str):
+    """Отменить напоминание для поиска."""
+    scheduled_reminders.discard(search_id)
+
+
+async def send_expiry_reminder(bot: Bot, user_id: int, search_id: str):
+    """Отправить напоминание, если результаты ещё не разблокированы."""
+    result = pending_results.get(search_id)
+    if result is None or result.get("_unlocked", False):
+        return
 
-async def schedule_expiry_reminder(bot: Bot, user_id: int, search_id: str):
-    """Напоминание за 5 минут до истечения результатов."""
     try:
-        await asyncio.sleep(REMINDER_DELAY_SECONDS)
-
-        # Проверяем существуют ли результаты и не разблокированы ли они
-        if search_id in pending_results:
-            result = pending_results[search_id]
-            if not result.get("_unlocked", False):
-                try:
-                    await bot.send_message(
-                        chat_id=user_id,
-                        text="⏰ <b>Осталось 5 минут!</b>\n\n"
-                             "Ваши результаты поиска скоро исчезнут.\n"
-                             f"🔥 Разблокируйте все за <b>{UNLOCK_ALL_STARS} ⭐</b>",
-                        reply_markup=get_unlock_all_keyboard(search_id)
-                    )
-                    logger.info(f"Reminder sent to {user_id} for search {search_id}")
-                except Exception as e:
-                    logger.error(f"Failed to send reminder: {e}")
+        await bot.send_message(
+            chat_id=user_id,
+            text="⏰ <b>Осталось 5 минут!</b>\n\n"
+                 "Ваши результаты поиска скоро исчезнут.\n"
+                 f"🔥 Разблокируйте все за <b>{UNLOCK_ALL_STARS} ⭐</b>",
+            reply_markup=get_unlock_all_keyboard(search_id)
+        )
+        logger.info(f"Reminder sent to {user_id} for search {search_id}")
+    except Exception as e:
+        logger.error(f"Failed to send reminder: {e}")
+
+
+async def reminder_worker(bot: Bot):
+    """Одна задача на все напоминания: спит до ближайшего и отправляет по порядку."""
+    while True:
+        if not reminder_heap:
+            await reminder_added.wait()
+            reminder_added.clear()
+            continue
+
+        delay = reminder_heap[0][0] - time.time()
+        if delay > 0:
+            # Просыпаемся раньше, если в очередь добавили новое напоминание
+            try:
+                await asyncio.wait_for(reminder_added.wait(), timeout=delay)
+                reminder_added.clear()
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        _, search_id, user_id = heapq.heappop(reminder_heap)
+        if search_id not in scheduled_reminders:
+            continue
+        scheduled_reminders.discard(search_id)
+        await send_expiry_reminder(bot, user_id, search_id)
+
+
+def store_pending_result(search_id: str, result: dict):
+    """Сохранить результаты поиска, вытесняя самые старые при переполнении."""
+    result["_created_at"] = time.time()
+    pending_results[search_id] = result
+    pending_results.move_to_end(search_id)
+
+    while len(pending_results) > MAX_PENDING_RESULTS:
+        evicted_id, _ = pending_results.popitem(last=False)
+        cancel_reminder(evicted_id)
 
-    except asyncio.CancelledError:
-        pass
-    finally:
-        if search_id in pending_reminders:
-            del pending_reminders[search_id]
+
+def remember_for_user(store: OrderedDict, user_id: int, value, max_size: int):
+    """Сохранить значение пользователя, вытесняя самые давние записи при переполнении."""
+    store[user_id] = value
+    store.move_to_end(user_id)
+    while len(store) > max_size:
+        store.popitem(last=False)
+
+
+async def sweep_expired_results():
+    """Периодически удаляет истёкшие результаты поиска."""
+    while True:
+        await asyncio.sleep(RESULTS_SWEEP_INTERVAL_SECONDS)
+
+        # Записи упорядочены по времени создания - останавливаемся на первой свежей
+        now = time.time()
+        while pending_results:
+            search_id, result = next(iter(pending_results.items()))
+            if now - result.get("_created_at", 0) <= RESULTS_EXPIRATION_SECONDS:
+                break
+            pending_results.popitem(last=False)
+            cancel_reminder(search_id)
+
+        # Отметки антиспама нужны только пока действует пауза
+        for timestamps, cooldown in ((last_photo_at, PHOTO_COOLDOWN_SECONDS), (last_nag_at, NAG_COOLDOWN_SECONDS)):
+            for user_id in [uid for uid, at in timestamps.items() if now - at >= cooldown]:
+                del timestamps[user_id]
 
 
 def mask_name(name: str) -> str:
@@ -165,14 +308,22 @@ def mask_name(name: str) -> str:
     return " ".join(masked_parts)
 
 
-def is_result_expired(search_id: str) -> bool:
-    """Проверка истёк ли результат поиска."""
-    if search_id not in pending_results:
-        return True
+def profile_name(profile: dict, fallback: str = "Без имени") -> str:
+    """Полное имя профиля VK/TikTok."""
+    name = f"{profile.get('first_name', '')} {profile.get('last_name', '')}".strip()
+    return name or fallback
+
+
+def get_live_result(search_id: str) -> dict | None:
+    """Результат поиска, если он ещё не истёк (одно обращение к словарю)."""
+    result = pending_results.get(search_id)
+    if result is None:
+        return None
 
-    result = pending_results[search_id]
     created_at = result.get("_created_at", 0)
-    return (time.time() - created_at) > RESULTS_EXPIRATION_SECONDS
+    if (time.time() - created_at) > RESULTS_EXPIRATION_SECONDS:
+        return None
+    return result
 
 WELCOME_MESSAGE = f"""<b>🔍 Бот Поиска по Лицу</b>
 
@@ -192,8 +343,9 @@ WELCOME_MESSAGE = f"""<b>🔍 Бот Поиска по Лицу</b>
 <i>Данные из открытых источников. Фото не сохраняются.</i>"""
 
 
+@lru_cache(maxsize=None)
 def get_mode_keyboard(current_mode: str = None) -> InlineKeyboardMarkup:
-    """Create keyboard for selecting search mode."""
+    """Create keyboard for selecting search mode (one shared markup per mode)."""
     internet_text = "🌐 Интернет" + (" ✓" if current_mode == "internet" else "")
     vk_text = "📱 VK" + (" ✓" if current_mode == "vk" else "")
     tt_text = "🎵 TikTok" + (" ✓" if current_mode == "tiktok" else "")
@@ -208,8 +360,9 @@ def get_mode_keyboard(current_mode: str = None) -> InlineKeyboardMarkup:
     ])
 
 
+@lru_cache(maxsize=None)
 def get_search_confirm_keyboard(mode: str) -> InlineKeyboardMarkup:
-    """Create keyboard to confirm search or change mode."""
+    """Create keyboard to confirm search or change mode (one shared markup per mode)."""
     if mode == "vk":
         return InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="🔍 Искать в VK", callback_data="confirm_search")],
@@ -236,64 +389,280 @@ def get_search_confirm_keyboard(mode: str) -> InlineKeyboardMarkup:
         ])
 
 
-def blur_image(img_bytes: bytes, blur_radius: int = 30) -> bytes:
-    """Apply heavy blur to image."""
+# Dedicated pool for image processing: PIL releases the GIL in its codecs,
+# so transcodes run in parallel on all cores without tying up the default executor.
+# PIL itself is imported by the first task in this pool, not at bot startup.
+image_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix="image")
+
+# Downloaded photos above this size are transcoded before sending
+SEND_PHOTO_MAX_BYTES = 150_000
+
+# Telegram shows result photos as previews, no need for more than this
+SEND_PHOTO_MAX_SIZE = 640
+SEND_JPEG_QUALITY = 80
+
+
+def _shrink_sync(img_bytes: bytes) -> bytes:
+    """Downscale and re-encode a photo for sending (blocking, run in a thread)."""
+    from PIL import Image
+
     img = Image.open(BytesIO(img_bytes))
-    blurred = img.filter(ImageFilter.GaussianBlur(radius=blur_radius))
+    img.draft("RGB", (SEND_PHOTO_MAX_SIZE, SEND_PHOTO_MAX_SIZE))
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    img.thumbnail((SEND_PHOTO_MAX_SIZE, SEND_PHOTO_MAX_SIZE))
     output = BytesIO()
-    blurred.save(output, format="JPEG", quality=70)
+    img.save(output, format="JPEG", quality=SEND_JPEG_QUALITY, optimize=False)
     return output.getvalue()
 
 
+async def shrink_photo(img_bytes: bytes) -> bytes:
+    """Make a large downloaded photo small enough for a quick upload to Telegram."""
+    if len(img_bytes) <= SEND_PHOTO_MAX_BYTES:
+        return img_bytes
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(image_executor, _shrink_sync, img_bytes)
+    except Exception as e:
+        # Telegram may still accept a format PIL can't decode
+        logger.warning(f"Failed to shrink photo: {e}")
+        return img_bytes
+
+
+IMAGE_FETCH_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8",
+    "Referer": "https://vk.com/",
+}
+
+# Larger downloads are aborted: a result photo is never this big
+MAX_IMAGE_DOWNLOAD_BYTES = 8 * 1024 * 1024
+IMAGE_DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Image file extension at the end of the URL path (query string and fragment allowed)
+IMAGE_URL_RE = re.compile(r"\.(?:jpe?g|png|webp|gif)(?:$|[?#])", re.IGNORECASE)
+
+_http_client: httpx.AsyncClient | None = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get or create the shared HTTP client for image downloads."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=10.0,
+            follow_redirects=True,
+            headers=IMAGE_FETCH_HEADERS,
+            limits=httpx.Limits(
+                max_connections=100,
+                max_keepalive_connections=50,
+                keepalive_expiry=30.0
+            ),
+            http2=True
+        )
+    return _http_client
+
+
 async def fetch_image_from_url(url: str) -> bytes | None:
-    """Fetch image from URL."""
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        "Accept": "image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8",
-        "Referer": "https://vk.com/",
-    }
+    """Fetch image from URL (the body is only read if it is an image of acceptable size)."""
     try:
-        async with httpx.AsyncClient(timeout=10.0, follow_redirects=True) as client:
-            response = await client.get(url, headers=headers)
-            if response.status_code == 200:
-                content_type = response.headers.get("content-type", "")
-                if "image" in content_type or url.lower().endswith(('.jpg', '.jpeg', '.png', '.webp', '.gif')):
-                    return response.content
-            else:
+        async with get_http_client().stream("GET", url) as response:
+            if response.status_code != 200:
                 logger.warning(f"Failed to fetch image: {response.status_code} from {url[:50]}...")
+                return None
+
+            content_type = response.headers.get("content-type", "")
+            if "image" not in content_type and not IMAGE_URL_RE.search(url):
+                return None
+
+            content_length = response.headers.get("content-length", "")
+            if content_length.isdigit() and int(content_length) > MAX_IMAGE_DOWNLOAD_BYTES:
+                logger.warning(f"Image too large ({content_length} bytes): {url[:50]}...")
+                return None
+
+            body = bytearray()
+            async for chunk in response.aiter_bytes(IMAGE_DOWNLOAD_CHUNK_SIZE):
+                body += chunk
+                if len(body) > MAX_IMAGE_DOWNLOAD_BYTES:
+                    logger.warning(f"Image exceeds {MAX_IMAGE_DOWNLOAD_BYTES} bytes: {url[:50]}...")
+                    return None
+            return bytes(body)
     except Exception as e:
         logger.error(f"Failed to fetch image from {url}: {e}")
     return None
 
 
-async def get_image_bytes(face: dict) -> bytes | None:
-    """Get image bytes from face result - try base64 first, then URL."""
-    # Try base64 first
+def result_items(result: dict) -> list[dict]:
+    """Face matches of a FaceCheck search result."""
+    return (result.get("output") or {}).get("items") or []
+
+
+# Fields of a face match that are read back from pending_results
+STORED_FACE_FIELDS = ("score", "url")
+
+
+def slim_face_result(result: dict) -> dict:
+    """Copy of a FaceCheck result for storage: unlocks and /debug only read score and url."""
+    return {
+        "id_search": result.get("id_search"),
+        "output": {"items": [
+            {key: face[key] for key in STORED_FACE_FIELDS if key in face}
+            for face in result_items(result)
+        ]},
+    }
+
+
+# Inline thumbnails look like "data:image/jpeg;base64,<payload>"
+DATA_URL_PREFIX = "data:image"
+DATA_URL_PREFIX_LEN = len(DATA_URL_PREFIX)
+DATA_URL_MAX_HEADER_LEN = 64
+
+
+def decode_face_base64(face: dict) -> bytes | None:
+    """Decode the inline data URL thumbnail of a face result, if any."""
     base64_img = face.get("base64", "")
-    if base64_img and base64_img.startswith("data:image"):
+    if not base64_img or not base64_img.startswith(DATA_URL_PREFIX):
+        return None
+
+    try:
+        # Slice after the header instead of splitting into a list of parts;
+        # the header is short, so a payload without one is not scanned to the end
+        comma = base64_img.find(",", DATA_URL_PREFIX_LEN, DATA_URL_MAX_HEADER_LEN)
+        if comma < 0:
+            raise ValueError("data URL without payload")
+        img_data = base64_img[comma + 1:]
         try:
-            img_data = base64_img.split(",", 1)[1]
-            return base64.b64decode(img_data)
-        except Exception as e:
-            logger.error(f"Base64 decode error: {e}")
+            return pybase64.b64decode(img_data, validate=True)
+        except ValueError:
+            # Non-canonical payload (line breaks etc.), binascii skips junk characters
+            return binascii.a2b_base64(img_data)
+    except Exception as e:
+        logger.error(f"Base64 decode error: {e}")
+        return None
+
+
+async def fetch_face_image(url: str) -> bytes | None:
+    """Fetch a result image, respecting the download concurrency limit."""
+    async with image_fetch_semaphore:
+        img_bytes = await fetch_image_from_url(url)
+    # Transcode outside the semaphore so the next download can start
+    return await shrink_photo(img_bytes) if img_bytes else None
+
+
+async def get_image_bytes(face: dict) -> bytes | None:
+    """Get image bytes from face result - try base64 first, then URL."""
+    img_bytes = decode_face_base64(face)
+    if img_bytes:
+        return img_bytes
 
     # Try image_url or thumb_url from API
     for url_field in ["image_url", "thumb_url", "url"]:
         url = face.get(url_field)
         if url and url.startswith("http"):
-            img_bytes = await fetch_image_from_url(url)
+            img_bytes = await fetch_face_image(url)
             if img_bytes:
                 return img_bytes
 
     return None
 
 
+async def get_photo_source(face: dict) -> bytes | str | None:
+    """Get photo for sending: inline bytes, or a direct image URL for Telegram to fetch."""
+    img_bytes = decode_face_base64(face)
+    if img_bytes:
+        return img_bytes
+
+    # Telegram downloads direct image links itself, no need to proxy them
+    for url_field in ["image_url", "thumb_url"]:
+        url = face.get(url_field)
+        if url and url.startswith("http"):
+            return url
+
+    # The page URL is only worth using if it actually serves an image
+    url = face.get("url")
+    if url and url.startswith("http"):
+        return await fetch_face_image(url)
+    return None
+
+
+async def fetch_profile_photos(profiles: list[dict]) -> list[bytes | None]:
+    """Fetch VK/TikTok profile photos concurrently (full photo, face thumbnail as fallback)."""
+    async def fetch(profile: dict) -> bytes | None:
+        photo_url = profile.get("source") or profile.get("face")
+        return await fetch_face_image(photo_url) if photo_url else None
+
+    return await asyncio.gather(*(fetch(profile) for profile in profiles))
+
+
+async def download_photo(bot: Bot, file_id: str) -> BytesIO:
+    """Download a Telegram photo into memory (the buffer is passed on as is, without copying)."""
+    file = await bot.get_file(file_id)
+    return await bot.download_file(file.file_path)
+
+
+async def take_pending_photo(message: Message, bot: Bot, user_id: int,
+                             failed_text: str | None = "⚠️ Не удалось загрузить фото. Попробуйте ещё раз.") -> BytesIO | None:
+    """Download the user's pending photo; the file_id is dropped only once the download succeeds."""
+    try:
+        image_bytes = await download_photo(bot, pending_photos[user_id])
+    except Exception as e:
+        logger.error(f"Failed to download photo for user {user_id}: {e}")
+        if failed_text:
+            await message.answer(failed_text)
+        return None
+    pending_photos.pop(user_id, None)
+    return image_bytes
+
+
 async def extract_names_from_results(faces: list[dict]) -> dict[str, str]:
     """Extract names from VK profiles in search results."""
-    urls = [face.get("url", "") for face in faces if face.get("url")]
+    urls = [face["url"] for face in faces if face.get("url")]
     return await vk_client.extract_names_from_urls(urls)
 
 
+# Shared by every message with links: built and validated once
+NO_LINK_PREVIEW = LinkPreviewOptions(is_disabled=True)
+
+# Keyboard markups are frozen pydantic models, so they are safe to share
+SEARCH_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(
+        text=f"🔍 Поиск - {SEARCH_COST_STARS} ⭐",
+        callback_data="paid_search"
+    )],
+])
+
+
+def get_search_keyboard() -> InlineKeyboardMarkup:
+    """Create keyboard for buying a paid search."""
+    return SEARCH_KEYBOARD
+
+
+BUY_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(
+        text=f"🔍 1 поиск — {SEARCH_COST_STARS} ⭐",
+        callback_data="buy_1_search"
+    )],
+    [InlineKeyboardButton(
+        text=f"🔥 5 поисков — {SEARCH_PACK_5_STARS} ⭐ (экономия {SEARCH_COST_STARS * 5 - SEARCH_PACK_5_STARS} ⭐)",
+        callback_data="buy_5_searches"
+    )],
+])
+
+
+def get_buy_keyboard() -> InlineKeyboardMarkup:
+    """Create keyboard for buying search packs."""
+    return BUY_KEYBOARD
+
+
+# Upsell after all results are unlocked
+UPSELL_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(
+        text=f"🔥 5 поисков — {SEARCH_PACK_5_STARS} ⭐",
+        callback_data="buy_5_searches"
+    )],
+])
+
+
 async def send_name_summary(message: Message, names: dict[str, str]):
     """Send summary of found names."""
     if not names:
@@ -305,41 +674,56 @@ async def send_name_summary(message: Message, names: dict[str, str]):
 
     await message.answer(
         "\n".join(lines),
-        link_preview_options=LinkPreviewOptions(is_disabled=True)
+        link_preview_options=NO_LINK_PREVIEW
     )
 
 
-def get_search_keyboard() -> InlineKeyboardMarkup:
-    """Create keyboard for buying a paid search."""
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(
-            text=f"🔍 Поиск - {SEARCH_COST_STARS} ⭐",
-            callback_data="paid_search"
-        )],
-    ])
+class UnlockCallback(CallbackData, prefix="unlock"):
+    """Кнопка открытия одного результата: unlock:<search_id>:<index>."""
+    search_id: str
+    index: int
+
 
+class UnlockAllCallback(CallbackData, prefix="unlock_all"):
+    """Кнопка открытия всех результатов: unlock_all:<search_id>."""
+    search_id: str
 
+
+@lru_cache(maxsize=4096)
 def get_unlock_keyboard(search_id: str, result_index: int) -> InlineKeyboardMarkup:
     """Create keyboard to unlock a single result link."""
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(
             text=f"🔓 Открыть - {UNLOCK_SINGLE_STARS} ⭐",
-            callback_data=f"unlock_{search_id}_{result_index}"
+            callback_data=UnlockCallback(search_id=search_id, index=result_index).pack()
         )],
     ])
 
 
+@lru_cache(maxsize=4096)
+def get_unlock_choice_keyboard(search_id: str, count: int) -> InlineKeyboardMarkup:
+    """Create one keyboard with unlock buttons for each shown result."""
+    return InlineKeyboardMarkup(inline_keyboard=[[
+        InlineKeyboardButton(
+            text=f"🔓 #{i + 1}",
+            callback_data=UnlockCallback(search_id=search_id, index=i).pack()
+        )
+        for i in range(count)
+    ]])
+
+
+@lru_cache(maxsize=4096)
 def get_unlock_all_keyboard(search_id: str) -> InlineKeyboardMarkup:
     """Create keyboard to unlock all results at once."""
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(
             text=f"🔓 Открыть ВСЕ 10 - {UNLOCK_ALL_STARS} ⭐",
-            callback_data=f"unlock_all_{search_id}"
+            callback_data=UnlockAllCallback(search_id=search_id).pack()
         )],
     ])
 
 
-@router.message(CommandStart())
+@commands_router.message(CommandStart())
 async def cmd_start(message: Message):
     user = await db.get_or_create_user(
         message.from_user.id,
@@ -359,7 +743,7 @@ async def cmd_start(message: Message):
     mode_text = mode_texts.get(current_mode, "🌐 Интернет")
 
     # Проверка ежедневного бонуса
-    granted = await db.check_and_grant_daily_free_search(user_id)
+    granted = await db.check_and_grant_daily_free_search(user_id, user)
     bonus_text = ""
     if granted:
         bonus_text = "🎁 <b>Ежедневный бонус!</b> +1 бесплатный поиск!\n\n"
@@ -370,14 +754,14 @@ async def cmd_start(message: Message):
     )
 
 
-@router.message(Command("info"))
+@commands_router.message(Command("info"))
 async def cmd_info(message: Message):
     credits = await db.get_user_credits(message.from_user.id)
     free = credits.get("free_searches", 0)
     paid = credits.get("paid_searches", 0)
     total = free + paid
 
-    info = await facecheck.get_info()
+    info = await get_api_info()
     api_credits = "N/A"
     if info:
         api_credits = info.get('remaining_credits', 'N/A')
@@ -392,54 +776,47 @@ async def cmd_info(message: Message):
     )
 
 
-@router.message(Command("buy"))
+@commands_router.message(Command("buy"))
 async def cmd_buy(message: Message):
     credits = await db.get_user_credits(message.from_user.id)
     free = credits.get("free_searches", 0)
     paid = credits.get("paid_searches", 0)
 
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(
-            text=f"🔍 1 поиск — {SEARCH_COST_STARS} ⭐",
-            callback_data="buy_1_search"
-        )],
-        [InlineKeyboardButton(
-            text=f"🔥 5 поисков — {SEARCH_PACK_5_STARS} ⭐ (экономия {SEARCH_COST_STARS * 5 - SEARCH_PACK_5_STARS} ⭐)",
-            callback_data="buy_5_searches"
-        )],
-    ])
-
     await message.answer(
         f"<b>💰 Купить поиски</b>\n\n"
         f"Ваши кредиты: <b>{free + paid}</b>\n\n"
         f"Каждый поиск = 10 результатов с прямыми ссылками.\n\n"
         f"<i>💡 Нет звёзд? Команда /stars — где купить дешевле</i>",
-        reply_markup=keyboard
+        reply_markup=get_buy_keyboard()
     )
 
 
-@router.message(Command("stars"))
+STARS_MESSAGE = (
+    "<b>⭐ Как получить Telegram Stars</b>\n\n"
+    "1️⃣ <b>В Telegram</b> — нажмите любую кнопку оплаты\n"
+    "2️⃣ <b>fragment.com</b> — купите дешевле (до 30% экономии)\n"
+    "3️⃣ <b>За рубли</b> — на бирже gaming-goods.ru\n\n"
+    "<i>Fragment — официальная площадка Telegram</i>"
+)
+
+STARS_KEYBOARD = InlineKeyboardMarkup(inline_keyboard=[
+    [InlineKeyboardButton(
+        text="🇷🇺 Купить за рубли",
+        url="https://gaming-goods.ru/t/telegram-stars?product=966299&ref=20"
+    )]
+])
+
+
+@commands_router.message(Command("stars"))
 async def cmd_stars(message: Message):
     """Информация о покупке Telegram Stars."""
-    await message.answer(
-        "<b>⭐ Как получить Telegram Stars</b>\n\n"
-        "1️⃣ <b>В Telegram</b> — нажмите любую кнопку оплаты\n"
-        "2️⃣ <b>fragment.com</b> — купите дешевле (до 30% экономии)\n"
-        "3️⃣ <b>За рубли</b> — на бирже gaming-goods.ru\n\n"
-        "<i>Fragment — официальная площадка Telegram</i>",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(
-                text="🇷🇺 Купить за рубли",
-                url="https://gaming-goods.ru/t/telegram-stars?product=966299&ref=20"
-            )]
-        ])
-    )
+    await message.answer(STARS_MESSAGE, reply_markup=STARS_KEYBOARD)
 
 
-@router.message(Command("reset"))
+@commands_router.message(Command("reset"))
 async def cmd_reset(message: Message):
     """Сброс кредитов — только для АДМИНА."""
-    if str(message.from_user.id) != ADMIN_CHAT_ID:
+    if not is_admin(message.from_user.id):
         await message.answer("Эта команда недоступна.")
         return
 
@@ -452,10 +829,10 @@ async def cmd_reset(message: Message):
         await message.answer("Не удалось сбросить кредиты.")
 
 
-@router.message(Command("stats"))
+@commands_router.message(Command("stats"))
 async def cmd_stats(message: Message):
     """Статистика бота — только для АДМИНА."""
-    if str(message.from_user.id) != ADMIN_CHAT_ID:
+    if not is_admin(message.from_user.id):
         await message.answer("Эта команда недоступна.")
         return
 
@@ -475,7 +852,25 @@ async def cmd_stats(message: Message):
     )
 
 
-@router.message(Command("debug"))
+def split_into_chunks(lines: list[str], limit: int = 4000) -> list[str]:
+    """Склеить строки в сообщения не длиннее limit символов за один проход."""
+    chunks = []
+    start = 0
+    size = 0
+    for i, line in enumerate(lines):
+        line_len = len(line) + 1  # + перевод строки
+        if size + line_len > limit and i > start:
+            chunks.append("\n".join(lines[start:i]))
+            start = i
+            size = 0
+        size += line_len
+
+    if start < len(lines):
+        chunks.append("\n".join(lines[start:]))
+    return chunks
+
+
+@commands_router.message(Command("debug"))
 async def cmd_debug(message: Message):
     """Show all results from last search (for debugging)."""
     user_id = message.from_user.id
@@ -486,17 +881,15 @@ async def cmd_debug(message: Message):
         )
         return
 
-    search_id = last_search_by_user[user_id]
+    result = pending_results.get(last_search_by_user[user_id])
 
-    if search_id not in pending_results:
+    if result is None:
         await message.answer(
             "Результаты поиска устарели. Сделайте новый поиск."
         )
         return
 
-    result = pending_results[search_id]
-    output = result.get("output", {})
-    faces = output.get("items", [])
+    faces = result_items(result)
 
     if not faces:
         await message.answer("Нет результатов в последнем поиске.")
@@ -511,24 +904,8 @@ async def cmd_debug(message: Message):
         lines.append(f"{i}. [{score}%] {url}")
 
     # Split into chunks if too long (Telegram limit ~4096 chars)
-    full_text = "\n".join(lines)
-
-    if len(full_text) <= 4000:
-        await message.answer(full_text, link_preview_options=LinkPreviewOptions(is_disabled=True))
-    else:
-        # Send in chunks
-        chunk_lines = []
-        chunk_len = 0
-        for line in lines:
-            if chunk_len + len(line) + 1 > 4000:
-                await message.answer("\n".join(chunk_lines), link_preview_options=LinkPreviewOptions(is_disabled=True))
-                chunk_lines = []
-                chunk_len = 0
-            chunk_lines.append(line)
-            chunk_len += len(line) + 1
-
-        if chunk_lines:
-            await message.answer("\n".join(chunk_lines), link_preview_options=LinkPreviewOptions(is_disabled=True))
+    for chunk in split_into_chunks(lines):
+        await message.answer(chunk, link_preview_options=NO_LINK_PREVIEW)
 
 
 @router.callback_query(F.data == "paid_search")
@@ -690,7 +1067,7 @@ async def handle_confirm_search(callback: CallbackQuery, bot: Bot):
         await callback.answer("Фото не найдено. Отправьте новое фото.", show_alert=True)
         return
 
-    image_bytes = pending_photos.pop(user_id)
+    file_id = pending_photos[user_id]
     mode = user_search_mode.get(user_id, "internet")
     credits = await db.get_user_credits(user_id)
     free_searches = credits.get("free_searches", 0)
@@ -699,9 +1076,12 @@ async def handle_confirm_search(callback: CallbackQuery, bot: Bot):
 
     if mode == "vk":
         if free_searches > 0:
+            image_bytes = await take_pending_photo(callback.message, bot, user_id)
+            if image_bytes is None:
+                return
             await execute_free_vk_search(callback.message, bot, image_bytes)
         else:
-            pending_photos[user_id] = image_bytes
+            remember_for_user(pending_photos, user_id, file_id, MAX_PENDING_PHOTOS)
             await db.track_event(user_id, "payment_clicked", {"type": "vk_search"})
             await bot.send_invoice(
                 chat_id=user_id,
@@ -713,9 +1093,12 @@ async def handle_confirm_search(callback: CallbackQuery, bot: Bot):
             )
     elif mode == "tiktok":
         if free_searches > 0:
+            image_bytes = await take_pending_photo(callback.message, bot, user_id)
+            if image_bytes is None:
+                return
             await execute_free_tt_search(callback.message, bot, image_bytes)
         else:
-            pending_photos[user_id] = image_bytes
+            remember_for_user(pending_photos, user_id, file_id, MAX_PENDING_PHOTOS)
             await db.track_event(user_id, "payment_clicked", {"type": "tiktok_search"})
             await bot.send_invoice(
                 chat_id=user_id,
@@ -727,9 +1110,12 @@ async def handle_confirm_search(callback: CallbackQuery, bot: Bot):
             )
     else:  # internet
         if free_searches > 0:
+            image_bytes = await take_pending_photo(callback.message, bot, user_id)
+            if image_bytes is None:
+                return
             await execute_free_search(callback.message, bot, image_bytes)
         else:
-            pending_photos[user_id] = image_bytes
+            remember_for_user(pending_photos, user_id, file_id, MAX_PENDING_PHOTOS)
             await db.track_event(user_id, "payment_clicked", {"type": "internet_search"})
             await bot.send_invoice(
                 chat_id=user_id,
@@ -750,7 +1136,6 @@ async def handle_source_internet(callback: CallbackQuery, bot: Bot):
         await callback.answer("Фото не найдено. Отправьте новое фото.", show_alert=True)
         return
 
-    image_bytes = pending_photos[user_id]
     credits = await db.get_user_credits(user_id)
     free_searches = credits.get("free_searches", 0)
 
@@ -758,7 +1143,9 @@ async def handle_source_internet(callback: CallbackQuery, bot: Bot):
 
     if free_searches > 0:
         # Бесплатный поиск
-        pending_photos.pop(user_id, None)
+        image_bytes = await take_pending_photo(callback.message, bot, user_id)
+        if image_bytes is None:
+            return
         await execute_free_search(callback.message, bot, image_bytes)
     else:
         # Платный поиск - отправляем инвойс
@@ -782,7 +1169,6 @@ async def handle_source_vk(callback: CallbackQuery, bot: Bot):
         await callback.answer("Фото не найдено. Отправьте новое фото.", show_alert=True)
         return
 
-    image_bytes = pending_photos[user_id]
     credits = await db.get_user_credits(user_id)
     free_searches = credits.get("free_searches", 0)
 
@@ -790,7 +1176,9 @@ async def handle_source_vk(callback: CallbackQuery, bot: Bot):
 
     if free_searches > 0:
         # Бесплатный поиск по VK
-        pending_photos.pop(user_id, None)
+        image_bytes = await take_pending_photo(callback.message, bot, user_id)
+        if image_bytes is None:
+            return
         await execute_free_vk_search(callback.message, bot, image_bytes)
     else:
         # Платный поиск VK - отправляем инвойс
@@ -805,10 +1193,14 @@ async def handle_source_vk(callback: CallbackQuery, bot: Bot):
         )
 
 
-@router.callback_query(F.data.startswith("unlock_all_"))
-async def handle_unlock_all(callback: CallbackQuery, bot: Bot):
+# Invoice payload unlock_<search_id>_<index>; search_id may itself contain "_" (vk_123, tt_123)
+UNLOCK_RE = re.compile(r"^unlock_(?!all_)(.+)_(\d+)$")
+
+
+@router.callback_query(UnlockAllCallback.filter())
+async def handle_unlock_all(callback: CallbackQuery, bot: Bot, callback_data: UnlockAllCallback):
     """Разблокировать все 10 результатов сразу."""
-    search_id = callback.data.replace("unlock_all_", "")
+    search_id = callback_data.search_id
     await db.track_event(callback.from_user.id, "unlock_clicked", {"type": "unlock_all", "search_id": search_id})
     await bot.send_invoice(
         chat_id=callback.from_user.id,
@@ -821,15 +1213,10 @@ async def handle_unlock_all(callback: CallbackQuery, bot: Bot):
     await callback.answer()
 
 
-@router.callback_query(F.data.startswith("unlock_"))
-async def handle_unlock(callback: CallbackQuery, bot: Bot):
-    # Пропускаем если это unlock_all (обрабатывается отдельно)
-    if callback.data.startswith("unlock_all_"):
-        return
-
-    parts = callback.data.split("_")
-    search_id = parts[1]
-    result_index = int(parts[2])
+@router.callback_query(UnlockCallback.filter())
+async def handle_unlock(callback: CallbackQuery, bot: Bot, callback_data: UnlockCallback):
+    search_id = callback_data.search_id
+    result_index = callback_data.index
 
     await db.track_event(callback.from_user.id, "unlock_clicked", {"type": "unlock_single", "search_id": search_id})
 
@@ -850,6 +1237,13 @@ async def handle_pre_checkout(pre_checkout: PreCheckoutQuery, bot: Bot):
     await bot.answer_pre_checkout_query(pre_checkout.id, ok=True)
 
 
+# Пакеты поисков: payload -> (количество, ответ после оплаты)
+SEARCH_PACKS = {
+    "buy_1_search": (1, "✅ <b>1 поиск добавлен!</b>\n\n📸 Отправьте фото для начала поиска."),
+    "buy_5_searches": (5, "✅ <b>5 поисков добавлено!</b>\n\n📸 Отправьте фото для начала поиска."),
+}
+
+
 @router.message(F.successful_payment)
 async def handle_successful_payment(message: Message, bot: Bot):
     payload = message.successful_payment.invoice_payload
@@ -860,21 +1254,8 @@ async def handle_successful_payment(message: Message, bot: Bot):
     # Отслеживаем событие оплаты
     await db.track_event(user_id, "payment_completed", {"type": payload, "stars": stars})
 
-    if payload == "paid_search" or payload == "paid_search_internet":
-        # Пользователь оплатил поиск по интернету — выполняем его
-        await db.record_payment(user_id, stars, 1, payment_id)
-
-        if user_id not in pending_photos:
-            await message.answer(
-                "Оплата получена, но фото не найдено. Отправьте новое фото."
-            )
-            return
-
-        image_bytes = pending_photos.pop(user_id)
-        await execute_paid_search(message, bot, image_bytes)
-
-    elif payload == "paid_search_vk":
-        # Пользователь оплатил поиск по VK — выполняем его
+    if executor := PAID_SEARCH_EXECUTORS.get(payload):
+        # Пользователь оплатил поиск — выполняем его
         await db.record_payment(user_id, stars, 1, payment_id)
 
         if user_id not in pending_photos:
@@ -883,50 +1264,32 @@ async def handle_successful_payment(message: Message, bot: Bot):
             )
             return
 
-        image_bytes = pending_photos.pop(user_id)
-        await execute_paid_vk_search(message, bot, image_bytes)
-
-    elif payload == "paid_search_tt":
-        # Пользователь оплатил поиск по TikTok — выполняем его
-        await db.record_payment(user_id, stars, 1, payment_id)
-
-        if user_id not in pending_photos:
+        image_bytes = await take_pending_photo(message, bot, user_id, failed_text=None)
+        if image_bytes is None:
+            # Оплата не должна пропасть: возвращаем её поиском на счёт
+            await db.add_paid_searches(user_id, 1)
             await message.answer(
-                "Оплата получена, но фото не найдено. Отправьте новое фото."
+                "⚠️ Оплата получена, но фото не удалось загрузить. "
+                "Вам начислен 1 поиск — отправьте фото ещё раз."
             )
             return
+        await executor(message, bot, image_bytes)
 
-        image_bytes = pending_photos.pop(user_id)
-        await execute_paid_tt_search(message, bot, image_bytes)
-
-    elif payload == "buy_1_search":
-        # Добавляем 1 поиск
-        await db.add_paid_searches(user_id, 1)
-        await db.record_payment(user_id, stars, 1, payment_id)
-        await message.answer(
-            "✅ <b>1 поиск добавлен!</b>\n\n"
-            "📸 Отправьте фото для начала поиска."
-        )
-
-    elif payload == "buy_5_searches":
-        # Добавляем 5 поисков
-        await db.add_paid_searches(user_id, 5)
-        await db.record_payment(user_id, stars, 5, payment_id)
-        await message.answer(
-            "✅ <b>5 поисков добавлено!</b>\n\n"
-            "📸 Отправьте фото для начала поиска."
-        )
+    elif pack := SEARCH_PACKS.get(payload):
+        # Добавляем купленные поиски
+        amount, text = pack
+        await db.add_paid_searches(user_id, amount)
+        await db.record_payment(user_id, stars, amount, payment_id)
+        await message.answer(text)
 
     elif payload.startswith("unlock_all_"):
-        search_id = payload.replace("unlock_all_", "")
+        search_id = payload.removeprefix("unlock_all_")
 
         # Отменяем напоминание для этого поиска
-        if search_id in pending_reminders:
-            pending_reminders[search_id].cancel()
-            del pending_reminders[search_id]
+        cancel_reminder(search_id)
 
-        if search_id in pending_results and not is_result_expired(search_id):
-            results = pending_results[search_id]
+        results = get_live_result(search_id)
+        if results is not None:
             results["_unlocked"] = True  # Помечаем как разблокированные
 
             # Проверяем источник результатов (VK, TikTok или интернет)
@@ -935,38 +1298,30 @@ async def handle_successful_payment(message: Message, bot: Bot):
                 # VK или TikTok результаты
                 profiles = results.get("profiles", [])[:10]
                 source_name = "VK" if source == "vk" else "TikTok"
-                lines = [f"🔓 <b>Все профили {source_name} открыты!</b>\n"]
-                for i, p in enumerate(profiles, 1):
-                    score = p.get("score", 0)
-                    first = p.get("first_name", "")
-                    last = p.get("last_name", "")
-                    name = f"{first} {last}".strip() or "Без имени"
-                    url = p.get("profile", "N/A")
-                    lines.append(f"{i}. [{score}%] {name}\n   {url}")
+                header = f"🔓 <b>Все профили {source_name} открыты!</b>\n"
+                lines = [
+                    f"{i}. [{p.get('score', 0)}%] {profile_name(p)}\n   {p.get('profile', 'N/A')}"
+                    for i, p in enumerate(profiles, 1)
+                ]
             else:
                 # Интернет результаты
-                faces = results.get("output", {}).get("items", [])[:10]
-                lines = ["🔓 <b>Все ссылки открыты!</b>\n"]
-                for i, face in enumerate(faces, 1):
-                    score = face.get("score", 0)
-                    url = face.get("url", "N/A")
-                    lines.append(f"{i}. [{score}%] {url}")
+                faces = result_items(results)[:10]
+                header = "🔓 <b>Все ссылки открыты!</b>\n"
+                lines = [
+                    f"{i}. [{face.get('score', 0)}%] {face.get('url', 'N/A')}"
+                    for i, face in enumerate(faces, 1)
+                ]
 
             await message.answer(
-                "\n".join(lines),
-                link_preview_options=LinkPreviewOptions(is_disabled=True)
+                "\n".join([header, *lines]),
+                link_preview_options=NO_LINK_PREVIEW
             )
 
             # Upsell после разблокировки
             await message.answer(
                 "🔍 <b>Хотите искать ещё?</b>\n"
                 f"Купите больше поисков по <b>{SEARCH_COST_STARS} ⭐</b>!",
-                reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                    [InlineKeyboardButton(
-                        text=f"🔥 5 поисков — {SEARCH_PACK_5_STARS} ⭐",
-                        callback_data="buy_5_searches"
-                    )]
-                ])
+                reply_markup=UPSELL_KEYBOARD
             )
         else:
             await message.answer(
@@ -976,21 +1331,12 @@ async def handle_successful_payment(message: Message, bot: Bot):
 
         await db.record_payment(user_id, stars, 0, payment_id)
 
-    elif payload.startswith("unlock_"):
-        parts = payload.split("_")
-        # Для VK: unlock_vk_123_0, TikTok: unlock_tt_123_0, интернета: unlock_123_0
-        if parts[1] == "vk":
-            search_id = f"vk_{parts[2]}"
-            result_index = int(parts[3])
-        elif parts[1] == "tt":
-            search_id = f"tt_{parts[2]}"
-            result_index = int(parts[3])
-        else:
-            search_id = parts[1]
-            result_index = int(parts[2])
+    elif unlock_match := UNLOCK_RE.match(payload):
+        search_id = unlock_match.group(1)
+        result_index = int(unlock_match.group(2))
 
-        if search_id in pending_results and not is_result_expired(search_id):
-            results = pending_results[search_id]
+        results = get_live_result(search_id)
+        if results is not None:
             source = results.get("_source")
 
             if source in ("vk", "tiktok"):
@@ -1010,11 +1356,11 @@ async def handle_successful_payment(message: Message, bot: Bot):
                         f"Совпадение: {score}%\n"
                         f"👤 {name}\n"
                         f"🔗 {url}",
-                        link_preview_options=LinkPreviewOptions(is_disabled=True)
+                        link_preview_options=NO_LINK_PREVIEW
                     )
             else:
                 # Интернет результаты
-                faces = results.get("output", {}).get("items", [])
+                faces = result_items(results)
                 if result_index < len(faces):
                     face = faces[result_index]
                     url = face.get("url", "N/A")
@@ -1023,7 +1369,7 @@ async def handle_successful_payment(message: Message, bot: Bot):
                         f"🔓 <b>Ссылка открыта!</b>\n\n"
                         f"Совпадение: {face.get('score', 0)}%\n"
                         f"🔗 {url}",
-                        link_preview_options=LinkPreviewOptions(is_disabled=True)
+                        link_preview_options=NO_LINK_PREVIEW
                     )
         else:
             await message.answer(
@@ -1034,23 +1380,101 @@ async def handle_successful_payment(message: Message, bot: Bot):
         await db.record_payment(user_id, stars, 0, payment_id)
 
 
-async def execute_paid_search(message: Message, bot: Bot, image_bytes: bytes):
-    """Платный поиск: показываем 10 результатов со ссылками."""
-    status_msg = await message.answer("🔍 Поиск...")
+# Первые правки статуса идут часто, дальше интервал удваивается до потолка
+PROGRESS_EDIT_MIN_INTERVAL_SECONDS = 0.5
+PROGRESS_EDIT_MAX_INTERVAL_SECONDS = 8.0
+PROGRESS_MIN_STEP = 5
+
 
-    last_progress_text = ""
+@asynccontextmanager
+async def progress_editor(status_msg: Message, label: str):
+    """Прогресс поиска: колбэк только запоминает процент, статус правит одна фоновая задача."""
+    current = 0
 
     async def on_progress(progress: int):
-        nonlocal last_progress_text
-        new_text = f"🔍 Поиск... {progress}%"
-        if new_text != last_progress_text:
+        nonlocal current
+        current = max(current, progress)
+
+    async def editor_loop():
+        last_sent = -PROGRESS_MIN_STEP
+        interval = PROGRESS_EDIT_MIN_INTERVAL_SECONDS
+        while True:
+            await asyncio.sleep(interval)
+            if current - last_sent < PROGRESS_MIN_STEP:
+                continue
             try:
-                await status_msg.edit_text(new_text)
-                last_progress_text = new_text
+                await status_msg.edit_text(f"{label}{current}%")
+                last_sent = current
+                interval = min(interval * 2, PROGRESS_EDIT_MAX_INTERVAL_SECONDS)
             except TelegramBadRequest:
                 pass
+            except Exception as e:
+                # Прогресс — косметика: сетевые ошибки не должны ронять поиск
+                logger.warning(f"Progress edit failed: {e}")
+                interval = min(interval * 2, PROGRESS_EDIT_MAX_INTERVAL_SECONDS)
+
+    editor = asyncio.create_task(editor_loop())
+    try:
+        yield on_progress
+    finally:
+        # Дожидаемся остановки, чтобы запоздалая правка не затёрла итоговый статус
+        editor.cancel()
+        with suppress(asyncio.CancelledError):
+            await editor
 
-    result = await facecheck.find_face(image_bytes, demo=False, on_progress=on_progress)
+
+async def send_single_photo(message: Message, photo: BufferedInputFile | str, caption: str):
+    """Отправить одно фото; если Telegram не смог скачать ссылку — скачиваем сами."""
+    try:
+        await message.answer_photo(photo, caption=caption)
+        return
+    except Exception as e:
+        logger.error(f"Send photo error: {e}")
+
+    if isinstance(photo, str):
+        img_bytes = await fetch_face_image(photo)
+        if img_bytes:
+            try:
+                await message.answer_photo(BufferedInputFile(img_bytes, filename="face.jpg"), caption=caption)
+                return
+            except Exception as e:
+                logger.error(f"Send photo error: {e}")
+
+    await message.answer(caption, link_preview_options=NO_LINK_PREVIEW)
+
+
+async def send_photo_album(message: Message, photos: list[tuple[BufferedInputFile | str, str]]):
+    """Отправить фото с подписями одним альбомом (по 10 в запросе)."""
+    for start in range(0, len(photos), 10):
+        batch = photos[start:start + 10]
+        # Альбом должен содержать минимум 2 элемента
+        if len(batch) > 1:
+            try:
+                await message.answer_media_group([
+                    InputMediaPhoto(media=photo, caption=caption) for photo, caption in batch
+                ])
+                continue
+            except Exception as e:
+                logger.error(f"Send album error: {e}")
+
+        # Одиночное фото или альбом не ушёл (например, одна битая картинка) — по одному
+        for photo, caption in batch:
+            await send_single_photo(message, photo, caption)
+
+
+async def run_post_search_steps(*steps):
+    """Run independent post-search steps concurrently; a failing step is logged and does not stop the others."""
+    for result in await asyncio.gather(*steps, return_exceptions=True):
+        if isinstance(result, Exception):
+            logger.error(f"Post-search step failed: {result}")
+
+
+async def execute_paid_search(message: Message, bot: Bot, image_bytes: BinaryIO):
+    """Платный поиск: показываем 10 результатов со ссылками."""
+    status_msg = await message.answer("🔍 Поиск...")
+
+    async with progress_editor(status_msg, "🔍 Поиск... ") as on_progress:
+        result = await facecheck.find_face(image_bytes, demo=False, on_progress=on_progress)
 
     if not result:
         await status_msg.edit_text("Ошибка поиска. Попробуйте снова.")
@@ -1060,8 +1484,10 @@ async def execute_paid_search(message: Message, bot: Bot, image_bytes: bytes):
         await status_msg.edit_text(f"Ошибка: {result['error']}")
         return
 
-    output = result.get("output", {})
-    faces = output.get("items", [])
+    output = result.get("output") or {}
+    faces = result_items(result)
+    top_faces = faces[:10]
+    total_results = len(top_faces)
 
     searched = output.get('searchedFaces')
     searched_str = f"{searched:,}" if isinstance(searched, int) else "N/A"
@@ -1071,7 +1497,7 @@ async def execute_paid_search(message: Message, bot: Bot, image_bytes: bytes):
         f"<b>✅ Поиск завершён</b>\n\n"
         f"Просканировано лиц: {searched_str}\n"
         f"Время: {took_sec:.1f}с\n"
-        f"Результатов: {min(len(faces), 10)}\n"
+        f"Результатов: {total_results}\n"
     )
 
     if not faces:
@@ -1080,76 +1506,87 @@ async def execute_paid_search(message: Message, bot: Bot, image_bytes: bytes):
 
     # Сохраняем результаты с timestamp
     search_id = result.get("id_search") or str(message.message_id)
-    result["_created_at"] = time.time()
-    pending_results[search_id] = result
-    last_search_by_user[message.from_user.id] = search_id
+    store_pending_result(search_id, slim_face_result(result))
+    remember_for_user(last_search_by_user, message.from_user.id, search_id, MAX_PENDING_RESULTS)
 
     await status_msg.edit_text(stats + "\nОтправка результатов...")
 
-    # Платный поиск: показываем 10 результатов со ссылками
-    for i, face in enumerate(faces[:10], 1):
-        score = face.get("score", 0)
-        url = face.get("url", "N/A")
+    # Имена из VK профилей ищем, пока отправляются фото
+    names_task = asyncio.create_task(extract_names_from_results(top_faces))
+    try:
+        # Платный поиск: показываем 10 результатов со ссылками
+        # Готовим все изображения параллельно; прямые ссылки Telegram скачает сам
+        sources = await asyncio.gather(*(get_photo_source(face) for face in top_faces))
 
-        caption = f"<b>#{i}</b> — Совпадение: {score}%\n🔗 {url}"
+        album = []
+        for i, (face, source) in enumerate(zip(top_faces, sources), 1):
+            score = face.get("score", 0)
+            url = face.get("url", "N/A")
 
-        img_bytes = await get_image_bytes(face)
-        if img_bytes:
-            try:
-                photo_file = BufferedInputFile(img_bytes, filename=f"face_{i}.jpg")
-                await message.answer_photo(
-                    photo_file,
-                    caption=caption,
-                    link_preview_options=LinkPreviewOptions(is_disabled=True)
-                )
-            except Exception as e:
-                logger.error(f"Send photo error: {e}")
-                await message.answer(caption, link_preview_options=LinkPreviewOptions(is_disabled=True))
-        else:
-            await message.answer(caption, link_preview_options=LinkPreviewOptions(is_disabled=True))
+            caption = f"<b>#{i}</b> — Совпадение: {score}%\n🔗 {url}"
 
-    await status_msg.delete()
+            if isinstance(source, str):
+                album.append((source, caption))
+            elif source:
+                album.append((BufferedInputFile(source, filename=f"face_{i}.jpg"), caption))
+            else:
+                await message.answer(caption, link_preview_options=NO_LINK_PREVIEW)
 
-    # Извлекаем и показываем имена из VK профилей
-    names = await extract_names_from_results(faces[:10])
-    await send_name_summary(message, names)
+        # Все фото одним альбомом вместо отдельного запроса на каждое
+        await send_photo_album(message, album)
 
-    # Отслеживаем событие завершения поиска
-    await db.track_event(message.from_user.id, "search_completed", {"type": "paid", "results": min(len(faces), 10)})
+        await status_msg.delete()
 
-    # Уведомляем админа
-    await notify_admin_search(bot, message.from_user.id, message.from_user.username,
-                              "internet", is_paid=True, results_count=min(len(faces), 10))
-
-    # Проверяем баланс API и оповещаем если низкий
-    await check_api_balance_and_alert(bot)
+        names = await names_task
+    finally:
+        # Если отправка упала, задача не должна остаться висеть
+        names_task.cancel()
+
+    # Имена, аналитика, уведомление админа и проверка баланса API друг от друга не зависят
+    await run_post_search_steps(
+        send_name_summary(message, names),
+        db.track_event(message.from_user.id, "search_completed", {"type": "paid", "results": total_results}),
+        notify_admin_search(bot, message.from_user.id, message.from_user.username,
+                            "internet", is_paid=True, results_count=total_results),
+        check_api_balance_and_alert(bot),
+    )
 
 
 @router.message(F.photo)
 async def handle_photo(message: Message, bot: Bot):
     user_id = message.from_user.id
 
+    # Берём самое большое фото в пределах лимита
+    photo = next(
+        (p for p in reversed(message.photo) if (p.file_size or 0) <= MAX_PHOTO_SIZE_BYTES),
+        None
+    )
+    if photo is None:
+        await message.answer("Фото слишком большое. Отправьте фото поменьше.")
+        return
+
+    # Запоминаем file_id — само фото скачаем при запуске поиска; искать будем по последнему фото
+    remember_for_user(pending_photos, user_id, photo.file_id, MAX_PENDING_PHOTOS)
+
+    # Повторные фото подряд не трогают БД и не шлют ещё одно подтверждение
+    now = time.time()
+    if now - last_photo_at.get(user_id, 0) < PHOTO_COOLDOWN_SECONDS:
+        return
+    last_photo_at[user_id] = now
+
     user = await db.get_or_create_user(user_id, message.from_user.username)
 
     # Отслеживаем событие
     await db.track_event(user_id, "photo_sent")
 
-    # Проверяем ежедневный бесплатный поиск
-    await db.check_and_grant_daily_free_search(user_id)
-
-    # Скачиваем фото
-    photo = message.photo[-1]
-    file = await bot.get_file(photo.file_id)
-    image_data = await bot.download_file(file.file_path)
-    image_bytes = image_data.read()
-
-    # Сохраняем фото для последующего поиска
-    pending_photos[user_id] = image_bytes
+    # Проверяем ежедневный бесплатный поиск по уже полученной строке
+    if await db.check_and_grant_daily_free_search(user_id, user):
+        free_searches = 1
+    else:
+        free_searches = user.get("free_searches", 0)
 
     # Получаем текущий режим пользователя
     mode = user_search_mode.get(user_id, "internet")
-    credits = await db.get_user_credits(user_id)
-    free_searches = credits.get("free_searches", 0)
 
     # Формируем текст подтверждения
     if mode == "vk":
@@ -1176,23 +1613,12 @@ async def handle_photo(message: Message, bot: Bot):
     await message.answer(text, reply_markup=get_search_confirm_keyboard(mode))
 
 
-async def execute_free_search(message: Message, bot: Bot, image_bytes: bytes):
+async def execute_free_search(message: Message, bot: Bot, image_bytes: BinaryIO):
     """Бесплатный поиск: показываем только 3 результата со скрытыми ссылками."""
     status_msg = await message.answer("🔍 Поиск...")
 
-    last_progress_text = ""
-
-    async def on_progress(progress: int):
-        nonlocal last_progress_text
-        new_text = f"🔍 Поиск... {progress}%"
-        if new_text != last_progress_text:
-            try:
-                await status_msg.edit_text(new_text)
-                last_progress_text = new_text
-            except TelegramBadRequest:
-                pass
-
-    result = await facecheck.find_face(image_bytes, demo=False, on_progress=on_progress)
+    async with progress_editor(status_msg, "🔍 Поиск... ") as on_progress:
+        result = await facecheck.find_face(image_bytes, demo=False, on_progress=on_progress)
 
     if not result:
         await status_msg.edit_text("Ошибка поиска. Попробуйте снова.")
@@ -1205,8 +1631,10 @@ async def execute_free_search(message: Message, bot: Bot, image_bytes: bytes):
     # Используем бесплатный поиск
     await db.use_search(message.from_user.id)
 
-    output = result.get("output", {})
-    faces = output.get("items", [])
+    output = result.get("output") or {}
+    faces = result_items(result)
+    shown_faces = faces[:FREE_RESULTS_COUNT]
+    total_results = min(len(faces), 10)
 
     searched = output.get('searchedFaces')
     searched_str = f"{searched:,}" if isinstance(searched, int) else "N/A"
@@ -1216,7 +1644,7 @@ async def execute_free_search(message: Message, bot: Bot, image_bytes: bytes):
         f"<b>✅ Бесплатный поиск завершён</b>\n\n"
         f"Просканировано лиц: {searched_str}\n"
         f"Время: {took_sec:.1f}с\n"
-        f"Результатов: {min(len(faces), 10)}\n"
+        f"Результатов: {total_results}\n"
     )
 
     if not faces:
@@ -1225,51 +1653,57 @@ async def execute_free_search(message: Message, bot: Bot, image_bytes: bytes):
 
     # Сохраняем результаты с timestamp
     search_id = result.get("id_search") or str(message.message_id)
-    result["_created_at"] = time.time()
-    pending_results[search_id] = result
-    last_search_by_user[message.from_user.id] = search_id
+    store_pending_result(search_id, slim_face_result(result))
+    remember_for_user(last_search_by_user, message.from_user.id, search_id, MAX_PENDING_RESULTS)
 
-    # Вычисляем сколько ещё результатов скрыто
-    total_results = min(len(faces), 10)
-    hidden_count = total_results - FREE_RESULTS_COUNT
+    # Имена ищем, пока отправляются фото
+    names_task = asyncio.create_task(extract_names_from_results(faces[:total_results]))
+    try:
+        # Вычисляем сколько ещё результатов скрыто
+        hidden_count = total_results - FREE_RESULTS_COUNT
+
+        await status_msg.edit_text(
+            stats +
+            f"\n⏰ <b>Результаты действуют 30 минут!</b>\n"
+            f"<i>🔒 Показано {FREE_RESULTS_COUNT} из {total_results} результатов. "
+            f"Разблокируйте все {total_results} за {UNLOCK_ALL_STARS} ⭐</i>"
+        )
 
-    await status_msg.edit_text(
-        stats +
-        f"\n⏰ <b>Результаты действуют 30 минут!</b>\n"
-        f"<i>🔒 Показано {FREE_RESULTS_COUNT} из {total_results} результатов. "
-        f"Разблокируйте все {total_results} за {UNLOCK_ALL_STARS} ⭐</i>"
-    )
+        # Бесплатный поиск: показываем только FREE_RESULTS_COUNT результатов
+        # Загружаем все изображения параллельно
+        images = await asyncio.gather(*(get_image_bytes(face) for face in shown_faces))
 
-    # Бесплатный поиск: показываем только FREE_RESULTS_COUNT результатов
-    for i, face in enumerate(faces[:FREE_RESULTS_COUNT], 1):
-        score = face.get("score", 0)
+        album = []
+        no_photo_lines = []
+        for i, (face, img_bytes) in enumerate(zip(shown_faces, images), 1):
+            score = face.get("score", 0)
 
-        caption = f"<b>#{i}</b> — Совпадение: {score}%\n🔒 <i>Ссылка скрыта</i>"
+            caption = f"<b>#{i}</b> — Совпадение: {score}%\n🔒 <i>Ссылка скрыта</i>"
 
-        img_bytes = await get_image_bytes(face)
-        if img_bytes:
-            try:
-                photo_file = BufferedInputFile(img_bytes, filename=f"face_{i}.jpg")
-                await message.answer_photo(
-                    photo_file,
-                    caption=caption,
-                    reply_markup=get_unlock_keyboard(search_id, i - 1)
-                )
-            except Exception as e:
-                logger.error(f"Send photo error: {e}")
-                await message.answer(caption, reply_markup=get_unlock_keyboard(search_id, i - 1))
-        else:
-            await message.answer(caption, reply_markup=get_unlock_keyboard(search_id, i - 1))
+            if img_bytes:
+                album.append((BufferedInputFile(img_bytes, filename=f"face_{i}.jpg"), caption))
+            else:
+                no_photo_lines.append(caption)
 
-    # Показываем тизер скрытых результатов
-    if hidden_count > 0:
+        # Фото одним альбомом, кнопки открытия — одним сообщением под ним
+        await send_photo_album(message, album)
         await message.answer(
-            f"➕ <b>Ещё {hidden_count} результатов скрыто</b>\n"
-            f"<i>Разблокируйте чтобы увидеть!</i>"
+            "\n\n".join([*no_photo_lines, f"🔓 Открыть ссылку — <b>{UNLOCK_SINGLE_STARS} ⭐</b>"]),
+            reply_markup=get_unlock_choice_keyboard(search_id, len(shown_faces))
         )
 
-    # Извлекаем имена и показываем замаскированными
-    names = await extract_names_from_results(faces[:total_results])
+        # Показываем тизер скрытых результатов
+        if hidden_count > 0:
+            await message.answer(
+                f"➕ <b>Ещё {hidden_count} результатов скрыто</b>\n"
+                f"<i>Разблокируйте чтобы увидеть!</i>"
+            )
+
+        # Показываем найденные имена замаскированными
+        names = await names_task
+    finally:
+        # Если отправка упала, задача не должна остаться висеть
+        names_task.cancel()
     if names:
         teaser_lines = ["👤 <b>Найденные имена (скрыты):</b>\n"]
         for url, name in list(names.items())[:5]:  # Показываем макс 5 тизеров
@@ -1286,40 +1720,24 @@ async def execute_free_search(message: Message, bot: Bot, image_bytes: bytes):
         reply_markup=get_unlock_all_keyboard(search_id)
     )
 
-    # Отслеживаем событие завершения поиска
-    await db.track_event(message.from_user.id, "search_completed", {"type": "free", "results": total_results})
-
-    # Уведомляем админа
-    await notify_admin_search(bot, message.from_user.id, message.from_user.username,
-                              "internet", is_paid=False, results_count=total_results)
-
     # Запланировать напоминание за 5 минут до истечения
-    reminder_task = asyncio.create_task(
-        schedule_expiry_reminder(bot, message.from_user.id, search_id)
+    schedule_expiry_reminder(message.from_user.id, search_id)
+
+    # Аналитика, уведомление админа и проверка баланса API друг от друга не зависят
+    await run_post_search_steps(
+        db.track_event(message.from_user.id, "search_completed", {"type": "free", "results": total_results}),
+        notify_admin_search(bot, message.from_user.id, message.from_user.username,
+                            "internet", is_paid=False, results_count=total_results),
+        check_api_balance_and_alert(bot),
     )
-    pending_reminders[search_id] = reminder_task
-
-    # Проверяем баланс API и оповещаем если низкий
-    await check_api_balance_and_alert(bot)
 
 
-async def execute_free_vk_search(message: Message, bot: Bot, image_bytes: bytes):
+async def execute_free_vk_search(message: Message, bot: Bot, image_bytes: BinaryIO):
     """Бесплатный поиск по VK: показываем 3 результата со скрытыми ссылками."""
     status_msg = await message.answer("🔍 Поиск по VK...")
 
-    last_progress_text = ""
-
-    async def on_progress(progress: int):
-        nonlocal last_progress_text
-        new_text = f"🔍 Поиск по VK... {progress}%"
-        if new_text != last_progress_text:
-            try:
-                await status_msg.edit_text(new_text)
-                last_progress_text = new_text
-            except TelegramBadRequest:
-                pass
-
-    result = await search4faces.search_vk(image_bytes, source="vk_wall", results_count=10, on_progress=on_progress)
+    async with progress_editor(status_msg, "🔍 Поиск по VK... ") as on_progress:
+        result = await search4faces.search_vk(image_bytes, source="vk_wall", results_count=10, on_progress=on_progress)
 
     if not result:
         await status_msg.edit_text("Ошибка поиска. Попробуйте снова.")
@@ -1352,11 +1770,10 @@ async def execute_free_vk_search(message: Message, bot: Bot, image_bytes: bytes)
     search_id = f"vk_{message.message_id}"
     vk_result = {
         "profiles": profiles,
-        "_created_at": time.time(),
         "_source": "vk"
     }
-    pending_results[search_id] = vk_result
-    last_search_by_user[message.chat.id] = search_id
+    store_pending_result(search_id, vk_result)
+    remember_for_user(last_search_by_user, message.chat.id, search_id, MAX_PENDING_RESULTS)
 
     total_results = min(len(profiles), 10)
     hidden_count = total_results - FREE_RESULTS_COUNT
@@ -1369,7 +1786,11 @@ async def execute_free_vk_search(message: Message, bot: Bot, image_bytes: bytes)
     )
 
     # Показываем FREE_RESULTS_COUNT результатов
-    for i, profile in enumerate(profiles[:FREE_RESULTS_COUNT], 1):
+    # Загружаем фото профилей параллельно
+    shown_profiles = profiles[:FREE_RESULTS_COUNT]
+    photos = await fetch_profile_photos(shown_profiles)
+
+    for i, (profile, img_bytes) in enumerate(zip(shown_profiles, photos), 1):
         score = profile.get("score", 0)
         first_name = profile.get("first_name", "")
         last_name = profile.get("last_name", "")
@@ -1377,12 +1798,6 @@ async def execute_free_vk_search(message: Message, bot: Bot, image_bytes: bytes)
 
         caption = f"<b>#{i}</b> — Совпадение: {score}%\n👤 {mask_name(name)}\n🔒 <i>Ссылка скрыта</i>"
 
-        # Пробуем загрузить фото профиля (source = full photo, face = face thumbnail)
-        photo_url = profile.get("source") or profile.get("face")
-        img_bytes = None
-        if photo_url:
-            img_bytes = await fetch_image_from_url(photo_url)
-
         if img_bytes:
             try:
                 photo_file = BufferedInputFile(img_bytes, filename=f"vk_{i}.jpg")
@@ -1418,29 +1833,15 @@ async def execute_free_vk_search(message: Message, bot: Bot, image_bytes: bytes)
     await notify_admin_search(bot, message.chat.id, None, "vk", is_paid=False, results_count=total_results)
 
     # Напоминание
-    reminder_task = asyncio.create_task(
-        schedule_expiry_reminder(bot, message.chat.id, search_id)
-    )
-    pending_reminders[search_id] = reminder_task
+    schedule_expiry_reminder(message.chat.id, search_id)
 
 
-async def execute_paid_vk_search(message: Message, bot: Bot, image_bytes: bytes):
+async def execute_paid_vk_search(message: Message, bot: Bot, image_bytes: BinaryIO):
     """Платный поиск по VK: показываем 10 результатов со ссылками."""
     status_msg = await message.answer("🔍 Поиск по VK...")
 
-    last_progress_text = ""
-
-    async def on_progress(progress: int):
-        nonlocal last_progress_text
-        new_text = f"🔍 Поиск по VK... {progress}%"
-        if new_text != last_progress_text:
-            try:
-                await status_msg.edit_text(new_text)
-                last_progress_text = new_text
-            except TelegramBadRequest:
-                pass
-
-    result = await search4faces.search_vk(image_bytes, source="vk_wall", results_count=10, on_progress=on_progress)
+    async with progress_editor(status_msg, "🔍 Поиск по VK... ") as on_progress:
+        result = await search4faces.search_vk(image_bytes, source="vk_wall", results_count=10, on_progress=on_progress)
 
     if not result:
         await status_msg.edit_text("Ошибка поиска. Попробуйте снова.")
@@ -1470,16 +1871,20 @@ async def execute_paid_vk_search(message: Message, bot: Bot, image_bytes: bytes)
     search_id = f"vk_{message.message_id}"
     vk_result = {
         "profiles": profiles,
-        "_created_at": time.time(),
         "_source": "vk"
     }
-    pending_results[search_id] = vk_result
-    last_search_by_user[message.from_user.id] = search_id
+    store_pending_result(search_id, vk_result)
+    remember_for_user(last_search_by_user, message.from_user.id, search_id, MAX_PENDING_RESULTS)
 
     await status_msg.edit_text(stats + "\nОтправка результатов...")
 
     # Показываем 3 результата со ссылками
-    for i, profile in enumerate(profiles[:3], 1):
+    # Загружаем фото профилей параллельно
+    shown_profiles = profiles[:3]
+    photos = await fetch_profile_photos(shown_profiles)
+
+    album = []
+    for i, (profile, img_bytes) in enumerate(zip(shown_profiles, photos), 1):
         score = profile.get("score", 0)
         first_name = profile.get("first_name", "")
         last_name = profile.get("last_name", "")
@@ -1488,25 +1893,12 @@ async def execute_paid_vk_search(message: Message, bot: Bot, image_bytes: bytes)
 
         caption = f"<b>#{i}</b> — Совпадение: {score}%\n👤 {name}\n🔗 {vk_url}"
 
-        # Use 'source' for actual photo, 'face' as fallback
-        photo_url = profile.get("source") or profile.get("face")
-        img_bytes = None
-        if photo_url:
-            img_bytes = await fetch_image_from_url(photo_url)
-
         if img_bytes:
-            try:
-                photo_file = BufferedInputFile(img_bytes, filename=f"vk_{i}.jpg")
-                await message.answer_photo(
-                    photo_file,
-                    caption=caption,
-                    link_preview_options=LinkPreviewOptions(is_disabled=True)
-                )
-            except Exception as e:
-                logger.error(f"Send VK photo error: {e}")
-                await message.answer(caption, link_preview_options=LinkPreviewOptions(is_disabled=True))
+            album.append((BufferedInputFile(img_bytes, filename=f"vk_{i}.jpg"), caption))
         else:
-            await message.answer(caption, link_preview_options=LinkPreviewOptions(is_disabled=True))
+            await message.answer(caption, link_preview_options=NO_LINK_PREVIEW)
+
+    await send_photo_album(message, album)
 
     await status_msg.delete()
 
@@ -1518,23 +1910,12 @@ async def execute_paid_vk_search(message: Message, bot: Bot, image_bytes: bytes)
                               "vk", is_paid=True, results_count=min(len(profiles), 3))
 
 
-async def execute_free_tt_search(message: Message, bot: Bot, image_bytes: bytes):
+async def execute_free_tt_search(message: Message, bot: Bot, image_bytes: BinaryIO):
     """Бесплатный поиск по TikTok: показываем 3 результата со скрытыми ссылками."""
     status_msg = await message.answer("🔍 Поиск по TikTok...")
 
-    last_progress_text = ""
-
-    async def on_progress(progress: int):
-        nonlocal last_progress_text
-        new_text = f"🔍 Поиск по TikTok... {progress}%"
-        if new_text != last_progress_text:
-            try:
-                await status_msg.edit_text(new_text)
-                last_progress_text = new_text
-            except TelegramBadRequest:
-                pass
-
-    result = await search4faces.search_vk(image_bytes, source="tt_avatar", results_count=10, on_progress=on_progress)
+    async with progress_editor(status_msg, "🔍 Поиск по TikTok... ") as on_progress:
+        result = await search4faces.search_vk(image_bytes, source="tt_avatar", results_count=10, on_progress=on_progress)
 
     if not result:
         await status_msg.edit_text("Ошибка поиска. Попробуйте снова.")
@@ -1562,11 +1943,10 @@ async def execute_free_tt_search(message: Message, bot: Bot, image_bytes: bytes)
     search_id = f"tt_{message.message_id}"
     tt_result = {
         "profiles": profiles,
-        "_created_at": time.time(),
         "_source": "tiktok"
     }
-    pending_results[search_id] = tt_result
-    last_search_by_user[message.chat.id] = search_id
+    store_pending_result(search_id, tt_result)
+    remember_for_user(last_search_by_user, message.chat.id, search_id, MAX_PENDING_RESULTS)
 
     total_results = min(len(profiles), 10)
     hidden_count = total_results - FREE_RESULTS_COUNT
@@ -1579,7 +1959,11 @@ async def execute_free_tt_search(message: Message, bot: Bot, image_bytes: bytes)
     )
 
     # Показываем FREE_RESULTS_COUNT результатов
-    for i, profile in enumerate(profiles[:FREE_RESULTS_COUNT], 1):
+    # Загружаем фото профилей параллельно
+    shown_profiles = profiles[:FREE_RESULTS_COUNT]
+    photos = await fetch_profile_photos(shown_profiles)
+
+    for i, (profile, img_bytes) in enumerate(zip(shown_profiles, photos), 1):
         score = profile.get("score", 0)
         first_name = profile.get("first_name", "")
         last_name = profile.get("last_name", "")
@@ -1587,11 +1971,6 @@ async def execute_free_tt_search(message: Message, bot: Bot, image_bytes: bytes)
 
         caption = f"<b>#{i}</b> — Совпадение: {score}%\n👤 {mask_name(name)}\n🔒 <i>Ссылка скрыта</i>"
 
-        photo_url = profile.get("source") or profile.get("face")
-        img_bytes = None
-        if photo_url:
-            img_bytes = await fetch_image_from_url(photo_url)
-
         if img_bytes:
             try:
                 photo_file = BufferedInputFile(img_bytes, filename=f"tt_{i}.jpg")
@@ -1627,29 +2006,15 @@ async def execute_free_tt_search(message: Message, bot: Bot, image_bytes: bytes)
     await notify_admin_search(bot, message.chat.id, None, "tiktok", is_paid=False, results_count=total_results)
 
     # Напоминание
-    reminder_task = asyncio.create_task(
-        schedule_expiry_reminder(bot, message.chat.id, search_id)
-    )
-    pending_reminders[search_id] = reminder_task
+    schedule_expiry_reminder(message.chat.id, search_id)
 
 
-async def execute_paid_tt_search(message: Message, bot: Bot, image_bytes: bytes):
+async def execute_paid_tt_search(message: Message, bot: Bot, image_bytes: BinaryIO):
     """Платный поиск по TikTok: показываем 10 результатов со ссылками."""
     status_msg = await message.answer("🔍 Поиск по TikTok...")
 
-    last_progress_text = ""
-
-    async def on_progress(progress: int):
-        nonlocal last_progress_text
-        new_text = f"🔍 Поиск по TikTok... {progress}%"
-        if new_text != last_progress_text:
-            try:
-                await status_msg.edit_text(new_text)
-                last_progress_text = new_text
-            except TelegramBadRequest:
-                pass
-
-    result = await search4faces.search_vk(image_bytes, source="tt_avatar", results_count=10, on_progress=on_progress)
+    async with progress_editor(status_msg, "🔍 Поиск по TikTok... ") as on_progress:
+        result = await search4faces.search_vk(image_bytes, source="tt_avatar", results_count=10, on_progress=on_progress)
 
     if not result:
         await status_msg.edit_text("Ошибка поиска. Попробуйте снова.")
@@ -1674,16 +2039,20 @@ async def execute_paid_tt_search(message: Message, bot: Bot, image_bytes: bytes)
     search_id = f"tt_{message.message_id}"
     tt_result = {
         "profiles": profiles,
-        "_created_at": time.time(),
         "_source": "tiktok"
     }
-    pending_results[search_id] = tt_result
-    last_search_by_user[message.from_user.id] = search_id
+    store_pending_result(search_id, tt_result)
+    remember_for_user(last_search_by_user, message.from_user.id, search_id, MAX_PENDING_RESULTS)
 
     await status_msg.edit_text(stats + "\nОтправка результатов...")
 
     # Показываем 3 результата со ссылками
-    for i, profile in enumerate(profiles[:3], 1):
+    # Загружаем фото профилей параллельно
+    shown_profiles = profiles[:3]
+    photos = await fetch_profile_photos(shown_profiles)
+
+    album = []
+    for i, (profile, img_bytes) in enumerate(zip(shown_profiles, photos), 1):
         score = profile.get("score", 0)
         first_name = profile.get("first_name", "")
         last_name = profile.get("last_name", "")
@@ -1692,24 +2061,12 @@ async def execute_paid_tt_search(message: Message, bot: Bot, image_bytes: bytes)
 
         caption = f"<b>#{i}</b> — Совпадение: {score}%\n👤 {name}\n🔗 {tt_url}"
 
-        photo_url = profile.get("source") or profile.get("face")
-        img_bytes = None
-        if photo_url:
-            img_bytes = await fetch_image_from_url(photo_url)
-
         if img_bytes:
-            try:
-                photo_file = BufferedInputFile(img_bytes, filename=f"tt_{i}.jpg")
-                await message.answer_photo(
-                    photo_file,
-                    caption=caption,
-                    link_preview_options=LinkPreviewOptions(is_disabled=True)
-                )
-            except Exception as e:
-                logger.error(f"Send TT photo error: {e}")
-                await message.answer(caption, link_preview_options=LinkPreviewOptions(is_disabled=True))
+            album.append((BufferedInputFile(img_bytes, filename=f"tt_{i}.jpg"), caption))
         else:
-            await message.answer(caption, link_preview_options=LinkPreviewOptions(is_disabled=True))
+            await message.answer(caption, link_preview_options=NO_LINK_PREVIEW)
+
+    await send_photo_album(message, album)
 
     await status_msg.delete()
 
@@ -1721,26 +2078,78 @@ async def execute_paid_tt_search(message: Message, bot: Bot, image_bytes: bytes)
                               "tiktok", is_paid=True, results_count=min(len(profiles), 3))
 
 
-@router.message()
+# Платные поиски: payload инвойса -> исполнитель ("paid_search" — старые инвойсы)
+PAID_SEARCH_EXECUTORS = {
+    "paid_search": execute_paid_search,
+    "paid_search_internet": execute_paid_search,
+    "paid_search_vk": execute_paid_vk_search,
+    "paid_search_tt": execute_paid_tt_search,
+}
+
+
+@router.message(F.content_type.in_({ContentType.TEXT, ContentType.DOCUMENT, ContentType.VIDEO}))
 async def handle_other(message: Message):
+    # Стикеры, служебные сообщения и повторы подряд оставляем без ответа
+    now = time.time()
+    if now - last_nag_at.get(message.from_user.id, 0) < NAG_COOLDOWN_SECONDS:
+        return
+    last_nag_at[message.from_user.id] = now
+
     await message.answer(
         "📸 Отправьте фото для поиска по лицу."
     )
 
 
+_background_tasks: list[asyncio.Task] = []
+
+
+async def on_startup(bot: Bot):
+    """Start background maintenance tasks."""
+    _background_tasks.append(asyncio.create_task(sweep_expired_results()))
+    _background_tasks.append(asyncio.create_task(reminder_worker(bot)))
+
+
+async def on_shutdown():
+    """Stop background tasks and close shared HTTP sessions."""
+    for task in _background_tasks:
+        task.cancel()
+    _background_tasks.clear()
+
+    await facecheck.close()
+    await search4faces.close()
+    await vk_client.close()
+    await db.close()
+    if _http_client is not None:
+        await _http_client.aclose()
+
+
 def create_bot() -> tuple[Bot, Dispatcher]:
+    # One pooled session for all Bot API calls; orjson speeds up (de)serialization
+    session = AiohttpSession(
+        limit=100,
+        json_loads=orjson.loads,
+        json_dumps=lambda obj: orjson.dumps(obj).decode(),
+        timeout=60
+    )
     bot = Bot(
         token=TELEGRAM_BOT_TOKEN,
+        session=session,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
+    # Не даём всплескам отправки упереться в лимит Telegram и 429
+    bot.session.middleware(RateLimitMiddleware())
     # Initialize Dispatcher with FSM storage for gift cards
     dp = Dispatcher(storage=MemoryStorage())
 
     # Register gift card handlers FIRST
-    register_gift_card_handlers(router)
+    register_gift_card_handlers(router, commands_router)
 
-    # Then include router
+    # Then include routers (commands first)
+    dp.include_router(commands_router)
     dp.include_router(router)
 
+    dp.startup.register(on_startup)
+    dp.shutdown.register(on_shutdown)
+
     return bot, dp
 
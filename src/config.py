@@ -1,3 +1,4 @@
+import logging
 import os
 from dotenv import load_dotenv
 
@@ -10,6 +11,19 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 ADMIN_CHAT_ID = os.getenv("ADMIN_CHAT_ID")  # Your Telegram ID for alerts
 
+try:
+    ADMIN_CHAT_ID_INT = int(ADMIN_CHAT_ID) if ADMIN_CHAT_ID else None
+except ValueError:
+    logging.getLogger(__name__).warning(f"ADMIN_CHAT_ID is not a numeric Telegram ID: {ADMIN_CHAT_ID!r}")
+    ADMIN_CHAT_ID_INT = None
+
+# Webhook mode (optional): public HTTPS base URL; long polling is used when unset
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_PATH = "/webhook"
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")  # Required in webhook mode
+WEBAPP_HOST = os.getenv("WEBAPP_HOST", "0.0.0.0")
+WEBAPP_PORT = int(os.getenv("PORT", "8080"))
+
 FACECHECK_BASE_URL = "https://facecheck.id/api"
 
 # Social search pricing (search4faces.com)
@@ -24,3 +38,8 @@ UNLOCK_ALL_STARS = 35           # Unlock all 10 links
 
 # Alert settings
 API_BALANCE_ALERT_THRESHOLD = 50  # Alert when credits drop to this level
+
+
+def is_admin(user_id: int) -> bool:
+    """Check whether a Telegram user is the bot admin."""
+    return ADMIN_CHAT_ID_INT is not None and user_id == ADMIN_CHAT_ID_INT
@@ -17,44 +17,84 @@ class SupabaseClient:
             "Content-Type": "application/json",
             "Prefer": "return=representation"
         }
+        self._http: httpx.AsyncClient | None = None
+
+    def _get_http(self) -> httpx.AsyncClient:
+        """Get or create the pooled HTTP client (keeps connections to Supabase alive)."""
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient()
+        return self._http
+
+    async def close(self):
+        """Close the HTTP client."""
+        if self._http is not None and not self._http.is_closed:
+            await self._http.aclose()
 
     async def select(self, table: str, filters: dict = None, columns: str = "*") -> list:
         """Select rows from table."""
-        async with httpx.AsyncClient() as client:
-            url = f"{self.base_url}/{table}?select={columns}"
-            if filters:
-                for key, value in filters.items():
-                    url += f"&{key}=eq.{value}"
-
-            response = await client.get(url, headers=self.headers)
-            if response.status_code == 200:
-                return response.json()
-            logger.error(f"Select error: {response.status_code} - {response.text}")
+        client = self._get_http()
+        url = f"{self.base_url}/{table}?select={columns}"
+        if filters:
+            for key, value in filters.items():
+                url += f"&{key}=eq.{value}"
+
+        response = await client.get(url, headers=self.headers)
+        if response.status_code == 200:
+            return response.json()
+        logger.error(f"Select error: {response.status_code} - {response.text}")
+        return []
+
+    async def select_in(self, table: str, column: str, values: list, columns: str = "*") -> list:
+        """Select rows where column matches any of the values."""
+        if not values:
             return []
 
+        client = self._get_http()
+        url = f"{self.base_url}/{table}?select={columns}"
+        url += f"&{column}=in.({','.join(str(v) for v in values)})"
+
+        response = await client.get(url, headers=self.headers)
+        if response.status_code == 200:
+            return response.json()
+        logger.error(f"Select error: {response.status_code} - {response.text}")
+        return []
+
     async def insert(self, table: str, data: dict) -> Optional[dict]:
         """Insert row into table."""
-        async with httpx.AsyncClient() as client:
-            url = f"{self.base_url}/{table}"
-            response = await client.post(url, headers=self.headers, json=data)
-            if response.status_code in (200, 201):
-                result = response.json()
-                return result[0] if result else None
-            logger.error(f"Insert error: {response.status_code} - {response.text}")
-            return None
+        client = self._get_http()
+        url = f"{self.base_url}/{table}"
+        response = await client.post(url, headers=self.headers, json=data)
+        if response.status_code in (200, 201):
+            result = response.json()
+            return result[0] if result else None
+        logger.error(f"Insert error: {response.status_code} - {response.text}")
+        return None
+
+    async def insert_many(self, table: str, rows: list[dict]) -> list:
+        """Insert multiple rows into table in a single request."""
+        if not rows:
+            return []
+
+        client = self._get_http()
+        url = f"{self.base_url}/{table}"
+        response = await client.post(url, headers=self.headers, json=rows)
+        if response.status_code in (200, 201):
+            return response.json()
+        logger.error(f"Bulk insert error: {response.status_code} - {response.text}")
+        return []
 
     async def update(self, table: str, filters: dict, data: dict) -> bool:
         """Update rows in table."""
-        async with httpx.AsyncClient() as client:
-            url = f"{self.base_url}/{table}"
-            for key, value in filters.items():
-                url += f"?{key}=eq.{value}"
-
-            response = await client.patch(url, headers=self.headers, json=data)
-            if response.status_code in (200, 204):
-                return True
-            logger.error(f"Update error: {response.status_code} - {response.text}")
-            return False
+        client = self._get_http()
+        url = f"{self.base_url}/{table}"
+        for key, value in filters.items():
+            url += f"?{key}=eq.{value}"
+
+        response = await client.patch(url, headers=self.headers, json=data)
+        if response.status_code in (200, 204):
+            return True
+        logger.error(f"Update error: {response.status_code} - {response.text}")
+        return False
 
 
 _client: Optional[SupabaseClient] = None
@@ -70,6 +110,12 @@ def get_client() -> SupabaseClient:
     return _client
 
 
+async def close():
+    """Close the Supabase client's connections."""
+    if _client is not None:
+        await _client.close()
+
+
 async def get_or_create_user(telegram_id: int, username: str = None) -> dict:
     """Get user by telegram_id or create if not exists."""
     client = get_client()
@@ -287,19 +333,20 @@ async def get_stats() -> dict:
 
 # ============ ЕЖЕДНЕВНЫЙ БЕСПЛАТНЫЙ ПОИСК ============
 
-async def check_and_grant_daily_free_search(telegram_id: int) -> bool:
+async def check_and_grant_daily_free_search(telegram_id: int, user: dict = None) -> bool:
     """
     Проверка права на ежедневный бесплатный поиск.
     Если last_free_grant > 24ч назад, даём 1 бесплатный поиск.
+    Строку пользователя можно передать, чтобы не читать её повторно.
     Возвращает True если поиск был выдан.
     """
     client = get_client()
 
-    result = await client.select("users", {"telegram_id": telegram_id}, "free_searches,last_free_grant")
-    if not result:
-        return False
-
-    user = result[0]
+    if user is None:
+        result = await client.select("users", {"telegram_id": telegram_id}, "free_searches,last_free_grant")
+        if not result:
+            return False
+        user = result[0]
     last_grant = user.get("last_free_grant")
 
     # Проверяем прошло ли 24 часа
@@ -1,8 +1,9 @@
 import asyncio
 import logging
 import time
-from typing import Callable, Awaitable
+from typing import BinaryIO, Callable, Awaitable
 import aiohttp
+import orjson
 from src.config import FACECHECK_API_KEY, FACECHECK_BASE_URL
 
 logger = logging.getLogger(__name__)
@@ -19,6 +20,19 @@ class FaceCheckClient:
         self.base_url = FACECHECK_BASE_URL
         self._lock = asyncio.Lock()
         self._last_request_time = 0
+        self._session: aiohttp.ClientSession | None = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Get or create the shared HTTP session (keeps connections warm)."""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=100, ttl_dns_cache=300, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=TIMEOUT)
+        return self._session
+
+    async def close(self):
+        """Close the shared HTTP session."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
 
     async def _wait_for_rate_limit(self):
         """Ensure minimum interval between requests."""
@@ -48,6 +62,7 @@ class FaceCheckClient:
                     response = await session.get(url, **kwargs)
 
                 if response.status == 429:
+                    response.release()
                     wait_time = 30 * (attempt + 1)  # 30s, 60s, 90s
                     logger.warning(f"Rate limited (429). Waiting {wait_time}s...")
                     await asyncio.sleep(wait_time)
@@ -63,32 +78,32 @@ class FaceCheckClient:
 
         return None
 
-    async def upload_image(self, image_bytes: bytes, filename: str = "photo.jpg") -> str | None:
-        """Upload image and get search ID."""
+    async def upload_image(self, image_bytes: bytes | BinaryIO, filename: str = "photo.jpg") -> str | None:
+        """Upload image and get search ID. File objects are streamed without copying."""
         headers = {"Authorization": self.api_key}
 
         form = aiohttp.FormData()
         form.add_field("images", image_bytes, filename=filename, content_type="image/jpeg")
 
         try:
-            async with aiohttp.ClientSession(timeout=TIMEOUT) as session:
-                response = await self._request_with_retry(
-                    session, "POST",
-                    f"{self.base_url}/upload_pic",
-                    headers=headers,
-                    data=form
-                )
-
-                if not response:
-                    return None
+            session = self._get_session()
+            response = await self._request_with_retry(
+                session, "POST",
+                f"{self.base_url}/upload_pic",
+                headers=headers,
+                data=form
+            )
+
+            if not response:
+                return None
 
-                text = await response.text()
-                logger.info(f"Upload response: status={response.status}, body={text[:500]}")
+            text = await response.text()
+            logger.info(f"Upload response: status={response.status}, body={text[:500]}")
 
-                if response.status == 200:
-                    data = await response.json()
-                    return data.get("id_search")
-                return None
+            if response.status == 200:
+                data = orjson.loads(text)
+                return data.get("id_search")
+            return None
 
         except Exception as e:
             logger.error(f"Upload error: {type(e).__name__}: {e}")
@@ -115,40 +130,42 @@ class FaceCheckClient:
 
         last_progress = -1
         try:
-            async with aiohttp.ClientSession(timeout=TIMEOUT) as session:
-                while True:
-                    response = await self._request_with_retry(
-                        session, "POST",
-                        f"{self.base_url}/search",
-                        headers=headers,
-                        json=payload
-                    )
+            session = self._get_session()
+            while True:
+                response = await self._request_with_retry(
+                    session, "POST",
+                    f"{self.base_url}/search",
+                    headers=headers,
+                    json=payload
+                )
 
-                    if not response or response.status != 200:
-                        logger.error(f"Search failed")
-                        return None
+                if not response or response.status != 200:
+                    logger.error(f"Search failed")
+                    if response:
+                        response.release()
+                    return None
 
-                    data = await response.json()
-                    progress = data.get("progress", 0) or 0
+                data = orjson.loads(await response.read())
+                progress = data.get("progress", 0) or 0
 
-                    if data.get("error"):
-                        logger.error(f"Search error: {data.get('error')}")
-                        return {"error": data.get("error")}
+                if data.get("error"):
+                    logger.error(f"Search error: {data.get('error')}")
+                    return {"error": data.get("error")}
 
-                    # Notify progress every 20%
-                    if on_progress and progress > last_progress and progress % 20 == 0:
-                        await on_progress(progress)
-                        last_progress = progress
+                # Notify progress every 20%
+                if on_progress and progress > last_progress and progress % 20 == 0:
+                    await on_progress(progress)
+                    last_progress = progress
 
-                    logger.info(f"Search progress: {progress}%")
+                logger.info(f"Search progress: {progress}%")
 
-                    if progress >= 100:
-                        output = data.get("output", {})
-                        items = output.get("items", [])
-                        logger.info(f"Search complete: {len(items)} results")
-                        return data
+                if progress >= 100:
+                    output = data.get("output", {})
+                    items = output.get("items", [])
+                    logger.info(f"Search complete: {len(items)} results")
+                    return data
 
-                    await asyncio.sleep(3)  # Poll every 3 seconds
+                await asyncio.sleep(3)  # Poll every 3 seconds
 
         except Exception as e:
             logger.error(f"Search error: {type(e).__name__}: {e}")
@@ -159,16 +176,19 @@ class FaceCheckClient:
         headers = {"Authorization": self.api_key}
 
         try:
-            async with aiohttp.ClientSession(timeout=TIMEOUT) as session:
-                response = await self._request_with_retry(
-                    session, "POST",
-                    f"{self.base_url}/info",
-                    headers=headers
-                )
-
-                if response and response.status == 200:
-                    return await response.json()
+            session = self._get_session()
+            response = await self._request_with_retry(
+                session, "POST",
+                f"{self.base_url}/info",
+                headers=headers
+            )
+
+            if not response:
                 return None
+            if response.status == 200:
+                return orjson.loads(await response.read())
+            response.release()
+            return None
 
         except Exception as e:
             logger.error(f"Info error: {type(e).__name__}: {e}")
@@ -176,7 +196,7 @@ class FaceCheckClient:
 
     async def find_face(
         self,
-        image_bytes: bytes,
+        image_bytes: bytes | BinaryIO,
         demo: bool = True,
         on_progress: ProgressCallback = None
     ) -> dict | None:
@@ -10,7 +10,7 @@ from aiogram.fsm.state import State, StatesGroup
 import logging
 
 from src.gift_card_payment import gift_card_manager
-from src.config import ADMIN_CHAT_ID
+from src.config import is_admin
 from src import database as db
 
 logger = logging.getLogger(__name__)
@@ -70,7 +70,7 @@ async def cmd_cancel(message: Message, state: FSMContext):
 
 async def cmd_giftcards_stats(message: Message):
     """Show gift card statistics (admin only)."""
-    if str(message.from_user.id) != str(ADMIN_CHAT_ID):
+    if not is_admin(message.from_user.id):
         await message.answer("Access denied.")
         return
     
@@ -98,12 +98,13 @@ async def callback_redeem(query, state: FSMContext):
     )
 
 
-def register_gift_card_handlers(router: Router):
-    """Register all gift card handlers to the router."""
-    router.message.register(cmd_redeem, Command("redeem"))
+def register_gift_card_handlers(router: Router, commands_router: Router = None):
+    """Register all gift card handlers; slash commands go to commands_router if given."""
+    commands_router = commands_router or router
+    commands_router.message.register(cmd_redeem, Command("redeem"))
+    commands_router.message.register(cmd_cancel, Command("cancel"))
+    commands_router.message.register(cmd_giftcards_stats, Command("giftcards"))
+    commands_router.message.register(cmd_myredemptions, Command("myredemptions"))
     router.callback_query.register(callback_redeem, F.data == "cmd_redeem")
     router.message.register(process_gift_code, GiftCardStates.waiting_for_code)
-    router.message.register(cmd_cancel, Command("cancel"))
-    router.message.register(cmd_giftcards_stats, Command("giftcards"))
-    router.message.register(cmd_myredemptions, Command("myredemptions"))
 
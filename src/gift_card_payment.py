@@ -2,9 +2,12 @@
 Gift Card Payment System for Face Bot
 """
 
+import asyncio
+import base64
 import logging
 import secrets
 import string
+import time
 from datetime import datetime, timedelta
 from typing import Optional, Dict, List, Tuple
 
@@ -12,6 +15,13 @@ from src import database as db
 
 logger = logging.getLogger(__name__)
 
+# Max rows per bulk insert request (also bounds the duplicate-check URL)
+INSERT_CHUNK_SIZE = 250
+# Max bulk insert requests in flight
+INSERT_CONCURRENCY = 8
+# How long redemption stats are served from cache
+STATS_CACHE_TTL = 30  # seconds
+
 
 class GiftCardManager:
     """Manages gift card operations."""
@@ -19,6 +29,7 @@ class GiftCardManager:
     def __init__(self):
         self.code_length = 12
         self.code_format = string.ascii_uppercase + string.digits
+        self._stats_cache: Optional[Tuple[float, Dict]] = None
 
     @staticmethod
     def generate_code(length: int = 12) -> str:
@@ -26,6 +37,19 @@ class GiftCardManager:
         chars = string.ascii_uppercase + string.digits
         return "".join(secrets.choice(chars) for _ in range(length))
 
+    @staticmethod
+    def generate_codes(count: int, length: int = 12) -> List[str]:
+        """Generate unique random codes from a single entropy draw."""
+        # Base32 (A-Z, 2-7) is a subset of the code alphabet, 5 bytes -> 8 chars
+        nbytes = -(-count * length // 8) * 5
+        encoded = base64.b32encode(secrets.token_bytes(nbytes)).decode("ascii")
+        codes = {encoded[i:i + length] for i in range(0, count * length, length)}
+
+        while len(codes) < count:
+            codes.add(GiftCardManager.generate_code(length))
+
+        return list(codes)
+
     @staticmethod
     def format_code(code: str) -> str:
         """Format code to standard format (XXXX-XXXX-XXXX)."""
@@ -34,34 +58,75 @@ class GiftCardManager:
             return f"{code[:4]}-{code[4:8]}-{code[8:]}"
         return code
 
-    async def create_gift_cards(
+    def _build_card_rows(
         self,
         count: int,
         searches_amount: int,
         batch_id: str = None
     ) -> List[Dict]:
-        """Create multiple gift cards."""
-        created_cards = []
-        
-        for _ in range(count):
-            code = self.generate_code()
-            card_data = {
+        """Generate codes and build rows ready for insert."""
+        rows = []
+        # All cards of one batch share a creation timestamp
+        created_at = datetime.utcnow().isoformat()
+
+        # Generated codes are already upper-case without dashes,
+        # so format them directly instead of normalizing via format_code
+        for code in self.generate_codes(count, self.code_length):
+            rows.append({
                 "code": code,
-                "code_formatted": self.format_code(code),
+                "code_formatted": f"{code[:4]}-{code[4:8]}-{code[8:]}",
                 "searches_amount": searches_amount,
                 "batch_id": batch_id,
                 "is_redeemed": False,
                 "redeemed_by": None,
                 "redeemed_at": None,
-                "created_at": datetime.utcnow().isoformat()
-            }
+                "created_at": created_at
+            })
 
-            result = await db.get_client().insert("gift_cards", card_data)
-            if result:
-                created_cards.append(result)
-                logger.info(f"Created gift card: {code}")
-            else:
-                logger.error(f"Failed to create gift card: {code}")
+        return rows
+
+    async def create_gift_cards(
+        self,
+        count: int,
+        searches_amount: int,
+        batch_id: str = None
+    ) -> List[Dict]:
+        """Create multiple gift cards using chunked bulk inserts."""
+        # Code generation is CPU-bound, keep it off the event loop
+        rows = await asyncio.to_thread(
+            self._build_card_rows, count, searches_amount, batch_id
+        )
+
+        client = db.get_client()
+        semaphore = asyncio.Semaphore(INSERT_CONCURRENCY)
+
+        async def insert_chunk(chunk: List[Dict]) -> List[Dict]:
+            async with semaphore:
+                # One duplicate fails the whole bulk insert, so check codes first
+                existing = await client.select_in(
+                    "gift_cards", "code", [row["code"] for row in chunk], columns="code"
+                )
+                taken = {row["code"] for row in existing}
+                for row in chunk:
+                    if row["code"] in taken:
+                        code = self.generate_code(self.code_length)
+                        row["code"] = code
+                        row["code_formatted"] = self.format_code(code)
+                        logger.warning("Regenerated colliding gift card code")
+
+                return await client.insert_many("gift_cards", chunk)
+
+        results = await asyncio.gather(*(
+            insert_chunk(rows[start:start + INSERT_CHUNK_SIZE])
+            for start in range(0, len(rows), INSERT_CHUNK_SIZE)
+        ))
+        created_cards = [card for chunk in results for card in chunk]
+        self._stats_cache = None
+
+        if created_cards:
+            logger.info(f"Created {len(created_cards)} gift cards (batch: {batch_id})")
+        else:
+            logger.error(f"Failed to create gift card batch: {batch_id}")
 
         return created_cards
 
@@ -125,6 +190,7 @@ class GiftCardManager:
             "redeemed_at": datetime.utcnow().isoformat()
         }
         await client.insert("gift_card_redemptions", redemption_data)
+        self._stats_cache = None
 
         logger.info(f"Gift card redeemed by user {telegram_id}")
 
@@ -143,11 +209,23 @@ class GiftCardManager:
             return []
 
     async def get_redemption_stats(self) -> Dict:
-        """Get overall redemption statistics."""
+        """Get overall redemption statistics (cached for STATS_CACHE_TTL)."""
+        if self._stats_cache:
+            cached_at, stats = self._stats_cache
+            if time.monotonic() - cached_at < STATS_CACHE_TTL:
+                return stats
+
+        stats = await self._compute_redemption_stats()
+        if stats:
+            self._stats_cache = (time.monotonic(), stats)
+        return stats
+
+    async def _compute_redemption_stats(self) -> Dict:
+        """Scan gift cards and redemptions to build statistics."""
         client = db.get_client()
         
         try:
-            cards = await client.select("gift_cards")
+            cards = await client.select("gift_cards", columns="is_redeemed,searches_amount")
             total_cards = len(cards) if cards else 0
             redeemed_cards = len([c for c in cards if c.get("is_redeemed")]) if cards else 0
             unredeemed_cards = total_cards - redeemed_cards
@@ -159,7 +237,7 @@ class GiftCardManager:
                 if c.get("is_redeemed")
             ) if cards else 0
 
-            redemptions = await client.select("gift_card_redemptions")
+            redemptions = await client.select("gift_card_redemptions", columns="telegram_id")
             total_redemptions = len(redemptions) if redemptions else 0
 
             unique_users = set()
@@ -1,6 +1,7 @@
 """Client for search4faces.com API - VK face search."""
 import base64
 import logging
+from io import BytesIO
 from typing import Callable
 
 import httpx
@@ -17,6 +18,18 @@ class Search4FacesClient:
 
     def __init__(self):
         self.api_key = SEARCH4FACES_API_KEY
+        self._http: httpx.AsyncClient | None = None
+
+    def _get_http(self) -> httpx.AsyncClient:
+        """Get or create the pooled HTTP client."""
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(timeout=60)
+        return self._http
+
+    async def close(self):
+        """Close the HTTP client."""
+        if self._http is not None and not self._http.is_closed:
+            await self._http.aclose()
 
     async def _call_api(self, method: str, params: dict = None) -> dict:
         """Make JSON-RPC 2.0 call to search4faces API."""
@@ -37,9 +50,9 @@ class Search4FacesClient:
         }
 
         try:
-            async with httpx.AsyncClient(timeout=60) as client:
-                response = await client.post(API_URL, headers=headers, json=payload)
-                return response.json()
+            client = self._get_http()
+            response = await client.post(API_URL, headers=headers, json=payload)
+            return response.json()
         except Exception as e:
             logger.error(f"search4faces API error: {e}")
             return {"error": str(e)}
@@ -51,9 +64,14 @@ class Search4FacesClient:
             return result["result"]
         return None
 
-    async def detect_faces(self, image_bytes: bytes) -> dict | None:
+    async def detect_faces(self, image_bytes: bytes | BytesIO) -> dict | None:
         """Detect faces in image. Returns image reference and face data."""
-        image_base64 = base64.b64encode(image_bytes).decode('utf-8')
+        if isinstance(image_bytes, BytesIO):
+            # Encode straight from the downloaded buffer instead of copying it out with read()
+            with image_bytes.getbuffer() as view:
+                image_base64 = base64.b64encode(view).decode('utf-8')
+        else:
+            image_base64 = base64.b64encode(image_bytes).decode('utf-8')
 
         result = await self._call_api("detectFaces", {"image": image_base64})
 
@@ -65,7 +83,7 @@ class Search4FacesClient:
 
     async def search_vk(
         self,
-        image_bytes: bytes,
+        image_bytes: bytes | BytesIO,
         source: str = "vk_wall",
         results_count: int = 10,
         on_progress: Callable[[int], None] = None
@@ -74,7 +92,7 @@ class Search4FacesClient:
         Search VK for faces matching the image.
 
         Args:
-            image_bytes: Image data
+            image_bytes: Image data or the downloaded BytesIO
             source: Search source (vk_wall, tt_avatar, etc.)
             results_count: Number of results to return
             on_progress: Optional callback for progress updates
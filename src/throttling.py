@@ -0,0 +1,73 @@
+"""Outgoing Bot API rate limiting."""
+import asyncio
+import logging
+import time
+from collections import deque
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+logger = logging.getLogger(__name__)
+
+# Telegram allows about 30 messages per second across all chats
+MAX_MESSAGES_PER_SECOND = 30
+# How many times a request is repeated after a 429 RetryAfter
+MAX_RETRIES = 3
+# Max Bot API requests in flight at once
+MAX_CONCURRENT_REQUESTS = 25
+
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    """Smooths bursts of chat messages into the bot-wide send limit, caps requests in flight
+    and retries on flood control."""
+
+    def __init__(
+        self,
+        rate: int = MAX_MESSAGES_PER_SECOND,
+        period: float = 1.0,
+        max_in_flight: int = MAX_CONCURRENT_REQUESTS,
+    ):
+        self.rate = rate
+        self.period = period
+        self._sent: deque[float] = deque()
+        self._lock = asyncio.Lock()
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+
+    async def _acquire(self):
+        """Wait until another message fits into the sliding window."""
+        async with self._lock:  # Waiters are served in order
+            now = time.monotonic()
+            while self._sent and now - self._sent[0] >= self.period:
+                self._sent.popleft()
+
+            if len(self._sent) >= self.rate:
+                wait_time = self.period - (now - self._sent.popleft())
+                logger.debug(f"Send limit reached, waiting {wait_time:.2f}s")
+                await asyncio.sleep(wait_time)
+                now = time.monotonic()
+
+            self._sent.append(now)
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        # Only methods that post into a chat count against the limit
+        limited = hasattr(method, "chat_id")
+
+        for attempt in range(MAX_RETRIES + 1):
+            if limited:
+                await self._acquire()
+            try:
+                async with self._in_flight:
+                    return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt == MAX_RETRIES:
+                    raise
+                logger.warning(f"Flood control on {type(method).__name__}, retrying in {e.retry_after}s")
+                await asyncio.sleep(e.retry_after)
@@ -1,5 +1,7 @@
 import re
+import time
 import logging
+from collections import OrderedDict
 from typing import Optional
 import httpx
 
@@ -11,6 +13,29 @@ HEADERS = {
     "Accept-Language": "ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7",
 }
 
+# Resolved names are reused across searches for this long
+NAME_CACHE_TTL = 3600  # seconds
+NAME_CACHE_MAX_SIZE = 10_000
+
+# username -> (resolved_at, name), oldest first
+_name_cache: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+_http_client: httpx.AsyncClient | None = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get or create the shared HTTP client for VK pages."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(timeout=10.0, follow_redirects=True, headers=HEADERS)
+    return _http_client
+
+
+async def close():
+    """Close the shared HTTP client."""
+    if _http_client is not None and not _http_client.is_closed:
+        await _http_client.aclose()
+
 
 def extract_vk_username(url: str) -> Optional[str]:
     """Extract username or ID from VK URL."""
@@ -34,34 +59,34 @@ async def scrape_vk_name(username: str) -> Optional[str]:
     url = f"https://vk.com/{username}"
 
     try:
-        async with httpx.AsyncClient(timeout=10.0, follow_redirects=True, headers=HEADERS) as client:
-            response = await client.get(url)
+        client = get_http_client()
+        response = await client.get(url)
 
-            if response.status_code != 200:
-                logger.warning(f"VK page fetch failed: {response.status_code}")
-                return None
+        if response.status_code != 200:
+            logger.warning(f"VK page fetch failed: {response.status_code}")
+            return None
 
-            html = response.text
-
-            # Try to extract name from <title> tag
-            # Format: "Имя Фамилия | ВКонтакте" or "Имя Фамилия | VK"
-            title_match = re.search(r'<title>([^|<]+)', html)
-            if title_match:
-                name = title_match.group(1).strip()
-                # Filter out non-profile pages
-                if name and name not in ('ВКонтакте', 'VK', 'Ошибка', 'Error', 'Страница удалена'):
-                    return name
-
-            # Try og:title meta tag
-            og_match = re.search(r'<meta\s+property="og:title"\s+content="([^"]+)"', html)
-            if og_match:
-                name = og_match.group(1).strip()
-                if name and '|' in name:
-                    name = name.split('|')[0].strip()
-                if name and name not in ('ВКонтакте', 'VK'):
-                    return name
+        html = response.text
+
+        # Try to extract name from <title> tag
+        # Format: "Имя Фамилия | ВКонтакте" or "Имя Фамилия | VK"
+        title_match = re.search(r'<title>([^|<]+)', html)
+        if title_match:
+            name = title_match.group(1).strip()
+            # Filter out non-profile pages
+            if name and name not in ('ВКонтакте', 'VK', 'Ошибка', 'Error', 'Страница удалена'):
+                return name
+
+        # Try og:title meta tag
+        og_match = re.search(r'<meta\s+property="og:title"\s+content="([^"]+)"', html)
+        if og_match:
+            name = og_match.group(1).strip()
+            if name and '|' in name:
+                name = name.split('|')[0].strip()
+            if name and name not in ('ВКонтакте', 'VK'):
+                return name
 
-            return None
+        return None
 
     except Exception as e:
         logger.error(f"VK scrape error for {username}: {e}")
@@ -95,20 +120,29 @@ async def get_name_from_vk_url(url: str) -> Optional[str]:
     if not username:
         return None
 
-    # Try scraping first
+    cached = _name_cache.get(username)
+    if cached and time.monotonic() - cached[0] < NAME_CACHE_TTL:
+        return cached[1]
+
+    # Try scraping first, fall back to guessing from username
     name = await scrape_vk_name(username)
-    if name:
-        return name
+    if not name:
+        # Not cached: a failed scrape may succeed on the next search
+        return guess_name_from_username(username)
 
-    # Fall back to guessing from username
-    return guess_name_from_username(username)
+    _name_cache[username] = (time.monotonic(), name)
+    _name_cache.move_to_end(username)
+    if len(_name_cache) > NAME_CACHE_MAX_SIZE:
+        _name_cache.popitem(last=False)
+    return name
 
 
 async def extract_names_from_urls(urls: list[str]) -> dict[str, str]:
     """Extract names from list of URLs. Returns {url: name}."""
     names = {}
 
-    for url in urls:
+    # Same profile often appears several times in one result set
+    for url in dict.fromkeys(urls):
         if "vk.com" in url.lower():
             name = await get_name_from_vk_url(url)
             if name: